@@ -0,0 +1,55 @@
+import argparse
+import subprocess
+import sys
+
+from pipeline.common.orchestrator import FAILURE_POLICIES, Orchestrator, find_hospitals
+
+LOCATIONS_METADATA_PATH = 'pipeline/resources/locations_metadata.json'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m pipeline')
+    parser.add_argument('-s', '--scrape', nargs='*', metavar='COUNTRY',
+                        help='scrape hospitals into raw files, optionally only these countries (mx, cr, dr)')
+    parser.add_argument('--hospitals', nargs='+', metavar='HOSPITAL',
+                        help='only scrape these hospitals (class name or hospital_short_name)')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='hospitals scraped in parallel (default: number of CPUs)')
+    parser.add_argument('--concurrency', type=int, default=None,
+                        help='pages in flight per host, overrides the metadata')
+    parser.add_argument('--on-failure', choices=FAILURE_POLICIES, default='continue')
+    parser.add_argument('--retries', type=int, default=1,
+                        help='resubmissions of a failed hospital with --on-failure retry')
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help='only re-extract new or changed doctors of stale hospitals')
+    parser.add_argument('-f', '--force', action='store_true',
+                        help='with --incremental, scrape hospitals that are still fresh')
+    parser.add_argument('--prometheus', action='store_true',
+                        help='also write the scrape telemetry in Prometheus text format')
+    parser.add_argument('-l', '--locations', action='store_true',
+                        help='aggregate hospital locations with the Google Maps API')
+    parser.add_argument('-t', '--test', action='store_true', help='run the data tests')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.scrape is not None:
+        jobs = find_hospitals(args.scrape, args.hospitals)
+        orchestrator = Orchestrator(args.workers, args.concurrency, args.on_failure,
+                                    args.retries, args.incremental, args.force, args.prometheus)
+        results = orchestrator.run(jobs)
+        if any(r['status'] == 'failed' for r in results):
+            sys.exit(1)
+
+    if args.locations:
+        from pipeline.scrapers.locations import Locations
+        Locations(LOCATIONS_METADATA_PATH).aggregate_locations()
+
+    if args.test:
+        sys.exit(subprocess.call([sys.executable, '-m', 'pytest', 'pipeline/tests']))
+
+
+if __name__ == '__main__':
+    main()
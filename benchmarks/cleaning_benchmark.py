@@ -0,0 +1,71 @@
+""" Benchmarks of the cleaners on the raw files, at several copies of the dataset:
+- provider normalization on Mexico: the per-row apply chain the country cleaners used vs
+  the shared normalize_providers;
+- column rules on every country: the .str chains the country cleaners ran on email, name,
+  additionalInformation and otherActivities vs the ColumnRules of their specs.
+Both sides must give identical output. The former chains are the test references of
+tests/cleaning_reference.py.
+
+Run from the directory containing `pipeline`:
+    python -m pipeline.benchmarks.cleaning_benchmark --scales 1 10 100
+"""
+import argparse
+import time
+
+import pandas as pd
+from pipeline.cleaners.cleaner import normalize_providers, providers_remapper
+from pipeline.tests.cleaning_reference import (COUNTRIES, LEGACY_COLUMNS, RULE_COLUMNS, legacy_clean_provider,
+                                               mexico_providers, raw_doctors, same_values, spec_rules)
+
+
+def clean_columns(df, functions) -> dict:
+    return {column: function(df) for column, function in functions.items()}
+
+
+def best_of(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print('Provider normalization')
+    providers = providers_remapper()
+    df = mexico_providers()
+    print(f'Mexico: {len(df)} doctors, {df.provider.nunique()} distinct providers')
+    print(f'{"scale":>5} {"rows":>8} {"apply chain":>12} {"vectorized":>11} {"speedup":>8}')
+    for scale in args.scales:
+        scaled = pd.concat([df] * scale, ignore_index=True)
+        legacy_seconds, legacy = best_of(lambda: legacy_clean_provider(scaled, providers), args.repeat)
+        seconds, result = best_of(lambda: normalize_providers(scaled['provider'], providers), args.repeat)
+        assert result.equals(legacy), 'normalize_providers output differs from the apply chain'
+        print(f'{scale:>4}x {len(scaled):>8} {legacy_seconds * 1000:>10.1f}ms {seconds * 1000:>9.1f}ms '
+              f'{legacy_seconds / seconds:>7.1f}x')
+
+    print(f'Column rules ({", ".join(RULE_COLUMNS)})')
+    print(f'{"":>3} {"scale":>5} {"rows":>8} {"str chains":>12} {"rules":>11} {"speedup":>8}')
+    for country in COUNTRIES:
+        df = raw_doctors(country)
+        rules = spec_rules(country)
+        engine = {column: (lambda d, column=column: rules[column].apply(d[column])) for column in RULE_COLUMNS}
+        legacy = {column: LEGACY_COLUMNS[column] for column in rules}
+        for scale in args.scales:
+            scaled = pd.concat([df] * scale, ignore_index=True)
+            legacy_seconds, expected = best_of(lambda: clean_columns(scaled, legacy), args.repeat)
+            seconds, result = best_of(lambda: clean_columns(scaled, engine), args.repeat)
+            for column in RULE_COLUMNS:
+                assert same_values(result[column], expected[column]), f'{country} {column} differs from the str chain'
+            print(f'{country:>3} {scale:>4}x {len(scaled):>8} {legacy_seconds * 1000:>10.1f}ms '
+                  f'{seconds * 1000:>9.1f}ms {legacy_seconds / seconds:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
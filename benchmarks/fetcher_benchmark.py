@@ -0,0 +1,64 @@
+""" Benchmarks the sequential doctor loop against AsyncDoctorFetcher on a local stand-in server.
+
+Run from the directory containing `pipeline`:
+    python -m pipeline.benchmarks.fetcher_benchmark --doctors 200 --latency 0.05
+"""
+import argparse
+import time
+
+import pandas as pd
+from pipeline.common import ratelimit
+from pipeline.common.fetcher import AsyncDoctorFetcher
+from pipeline.common.standin import StandInServer
+from pipeline.common.utils import open_dictionary
+from pipeline.models.doctor import Doctor
+
+FIXTURE_PATH = 'pipeline/benchmarks/fixtures/cima_doctor.html'
+METADATA_PATH = 'pipeline/resources/hospitals_metadata/costarica.json'
+
+
+def sequential_scrape(metadata, doctor_urls):
+    doctors = []
+    for url in doctor_urls:
+        try:
+            doctors.append(Doctor(metadata, 'static', url).extract_doctor_information())
+        except Exception as e:
+            print(e)
+    return pd.DataFrame(doctors)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        page = f.read()
+    metadata = open_dictionary(METADATA_PATH)['HospitalCima']
+    pages = {f'/en/doctor/{i}': page for i in range(args.doctors)}
+
+    # The stand-in server needs no politeness limits; measure the fetcher alone
+    ratelimit.configure_host('127.0.0.1', rate=None, concurrency=args.concurrency,
+                             max_concurrency=args.concurrency)
+    with StandInServer(pages, latency=args.latency) as server:
+        doctor_urls = [server.url(path) for path in pages]
+
+        start = time.perf_counter()
+        sequential = sequential_scrape(metadata, doctor_urls)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = AsyncDoctorFetcher(metadata, args.concurrency).scrape(doctor_urls)
+        concurrent_time = time.perf_counter() - start
+
+    assert sequential.shape == concurrent.shape
+    print(f'doctors={args.doctors} latency={args.latency}s concurrency={args.concurrency}')
+    print(f'sequential: {sequential_time:.2f}s ({args.doctors / sequential_time:.1f} pages/s)')
+    print(f'async:      {concurrent_time:.2f}s ({args.doctors / concurrent_time:.1f} pages/s)')
+    print(f'speedup:    {sequential_time / concurrent_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
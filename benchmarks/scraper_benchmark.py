@@ -0,0 +1,183 @@
+""" Offline throughput benchmark of every scraper class, replayed from recorded HTTP archives.
+
+Each scraper runs in a fresh interpreter against a ReplayServer, at 1x, 10x and 100x its
+recorded directory size, and the report lists pages/sec and peak RSS. Directories are
+scaled the way each site lists its doctors:
+    urls - one page per doctor: every doctor url is scraped `scale` times (as url copies)
+    ids  - Hospiten API: every professional id is requested `scale` times
+    body - all doctors on list pages: every HTML page body is repeated `scale` times
+
+Record archives from the live sites first (CentroMedico needs a browser and is not covered):
+    python -m pipeline.benchmarks.scraper_benchmark --record HospitalCima MedicaSur
+
+Run from the directory containing `pipeline`:
+    python -m pipeline.benchmarks.scraper_benchmark --scales 1 10 100
+HospitalCima falls back to a synthetic archive built from the benchmark fixtures.
+Translation runs offline too, through a DictionaryBackend that leaves texts as they are.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from pipeline.common import orchestrator, ratelimit, sessions, translator
+from pipeline.common.replay import ARCHIVE_PATH, HTTPArchive, ReplayServer, copy_url
+from pipeline.common.translation_backends import DictionaryBackend
+from pipeline.common.translation_memory import TranslationMemory
+
+FIXTURE_PATH = 'pipeline/benchmarks/fixtures/cima_doctor.html'
+SYNTHETIC_DOCTORS = 50
+
+SCRAPERS = {
+    'HospitalCima': ('cr', 'urls'),
+    'ClinicaCatolica': ('cr', 'urls'),
+    'ClinicaBiblica': ('cr', 'urls'),
+    'HospitalAngeles': ('mx', 'urls'),
+    'AngelesHealth': ('mx', 'urls'),
+    'AmerimedHospital': ('mx', 'body'),
+    'MedicaSur': ('mx', 'body'),
+    'HospitenCancun': ('mx', 'ids'),
+    'HospitenBavaro': ('dr', 'ids'),
+    'HospitenSantoDomingo': ('dr', 'ids'),
+    'ClinicaUnionMedicaDelNorte': ('dr', 'body'),
+}
+
+
+def load_job(class_name):
+    country = SCRAPERS[class_name][0]
+    return next(job for job in orchestrator.find_hospitals([country], [class_name]))
+
+
+def archive_path(country, metadata):
+    return f'{ARCHIVE_PATH}/{country}_{metadata["hospital_short_name"]}.zip'
+
+
+def synthetic_cima_archive(doctors=SYNTHETIC_DOCTORS) -> HTTPArchive:
+    """ CIMA's doctor index and `doctors` doctor pages, from the benchmark fixture page. """
+    archive = HTTPArchive()
+    base_url = 'https://directorio.hospitalcima.com'
+    links = ''.join(f'<a class="item" href="/en/doctor/{i}">Doctor {i}</a>' for i in range(doctors))
+    archive.add('GET', f'{base_url}/en/doctor', f'<html><body>{links}</body></html>'.encode('utf-8'))
+    with open(FIXTURE_PATH, 'rb') as f:
+        page = f.read()
+    for i in range(doctors):
+        archive.add('GET', f'{base_url}/en/doctor/{i}', page)
+    return archive
+
+
+def scaled(scraper_class, mode, scale):
+    """ Subclass of scraper_class listing every doctor url or id `scale` times. """
+    if scale == 1 or mode == 'body':
+        return scraper_class
+    if mode == 'urls':
+        class Scaled(scraper_class):
+            def _get_doctor_urls(self, *args, **kwargs):
+                return _copies(super()._get_doctor_urls(*args, **kwargs), scale)
+    else:
+        class Scaled(scraper_class):
+            def _iter_doctor_ids(self):
+                for doctor_id in super()._iter_doctor_ids():
+                    for _ in range(scale):
+                        yield doctor_id
+    return Scaled
+
+
+def _copies(urls, scale):
+    if hasattr(urls, '__aiter__'):
+        async def copies():
+            async for url in urls:
+                for copy in range(scale):
+                    yield copy_url(url, copy)
+        return copies()
+    return [copy_url(url, copy) for url in urls for copy in range(scale)]
+
+
+def peak_rss_mb():
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(class_name, scale, latency):
+    """ Replays one scraper at one scale in this process and returns its measurements. """
+    country, class_name, metadata = load_job(class_name)
+    path = archive_path(country, metadata)
+    if os.path.isfile(path):
+        archive = HTTPArchive.load(path)
+    elif class_name == 'HospitalCima':
+        archive = synthetic_cima_archive()
+    else:
+        return {'error': f'no archive at {path}'}
+
+    mode = SCRAPERS[class_name][1]
+    scraper_class = scaled(orchestrator.resolve_scraper(country, class_name), mode, scale)
+    concurrency = int(metadata.get('concurrency', 8))
+    ratelimit.configure_host('127.0.0.1', rate=None, concurrency=concurrency, max_concurrency=concurrency)
+    memory_dir = tempfile.TemporaryDirectory()
+    translator.configure(lambda name: DictionaryBackend(),
+                         TranslationMemory(os.path.join(memory_dir.name, 'translations.sqlite3')))
+    with memory_dir, ReplayServer(archive, latency=latency, scale=scale if mode == 'body' else 1) as server:
+        sessions.configure(cache=None, replay=server)
+        start = time.perf_counter()
+        try:
+            df = scraper_class(metadata).scrape()
+            error = None
+        except Exception as e:
+            df, error = None, repr(e)[:80]
+        seconds = time.perf_counter() - start
+    return {'pages': server.requests_served, 'doctors': len(df) if df is not None else 0,
+            'seconds': seconds, 'pages_per_second': server.requests_served / seconds,
+            'peak_rss_mb': peak_rss_mb(), 'missing': len(server.missing), 'error': error}
+
+
+def record(class_names):
+    """ Scrapes the live sites and saves every response into each scraper's archive. """
+    os.makedirs(ARCHIVE_PATH, exist_ok=True)
+    for class_name in class_names:
+        country, class_name, metadata = load_job(class_name)
+        archive = HTTPArchive()
+        sessions.configure(cache=None, archive=archive)
+        orchestrator.resolve_scraper(country, class_name)(metadata).scrape()
+        path = archive_path(country, metadata)
+        archive.save(path)
+        print(f'{class_name}: {len(archive)} responses recorded to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scrapers', nargs='+', default=list(SCRAPERS))
+    parser.add_argument('--scales', nargs='+', type=int, default=[1, 10, 100])
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--record', nargs='+', metavar='SCRAPER')
+    parser.add_argument('--run', nargs=2, metavar=('SCRAPER', 'SCALE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.record)
+        return
+    if args.run:
+        print(json.dumps(run(args.run[0], int(args.run[1]), args.latency)))
+        return
+
+    print(f'{"scraper":<28} {"scale":>5} {"pages":>7} {"doctors":>8} {"seconds":>8} {"pages/s":>8} {"peak RSS":>9}')
+    for class_name in args.scrapers:
+        for scale in args.scales:
+            output = subprocess.run(
+                [sys.executable, '-m', 'pipeline.benchmarks.scraper_benchmark', '--run', class_name,
+                 str(scale), '--latency', str(args.latency)], capture_output=True, text=True)
+            lines = output.stdout.strip().splitlines()
+            result = json.loads(lines[-1]) if lines else {'error': output.stderr.strip()[-80:]}
+            if 'pages' not in result:
+                print(f'{class_name:<28} {scale:>4}x  skipped: {result["error"]}')
+                break
+            note = f'  {result["missing"]} not in archive' if result['missing'] else ''
+            note += f'  failed: {result["error"]}' if result['error'] else ''
+            print(f'{class_name:<28} {scale:>4}x {result["pages"]:>7} {result["doctors"]:>8} '
+                  f'{result["seconds"]:>7.2f}s {result["pages_per_second"]:>8.1f} '
+                  f'{result["peak_rss_mb"]:>6.0f} MB{note}')
+
+
+if __name__ == '__main__':
+    main()
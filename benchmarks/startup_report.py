@@ -0,0 +1,87 @@
+""" Import-time and cold-start report for the pipeline, checked against a startup budget.
+
+Each module is imported, and each scraper class constructed, in a fresh interpreter, so
+the numbers are cold-start costs. The report lists which heavy third-party modules each
+one pulled in. Exits non-zero when a module goes over its budget or loads a module
+that should only be imported on first use.
+
+Run from the directory containing `pipeline`:
+    python -m pipeline.benchmarks.startup_report
+"""
+import json
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'numpy', 'lxml.html', 'requests', 'selenium',
+                 'fake_useragent', 'pygsheets', 'gspread', 'bs4']
+
+# Seconds allowed to import a module and construct one of its scrapers
+STARTUP_BUDGETS = {
+    'pipeline.scrapers.dr_scraper': 1.0,
+    'pipeline.scrapers.cr_scraper': 1.0,
+    'pipeline.scrapers.mx_scraper': 1.0,
+    'pipeline.scrapers.hospiten': 1.0,
+    'pipeline.common.translator': 0.75,
+}
+
+# Only loaded on first use (browser, Sheets client, user agents), never at startup
+LAZY_MODULES = ['selenium', 'fake_useragent', 'pygsheets', 'gspread', 'bs4']
+
+SCRAPERS = {
+    'pipeline.scrapers.dr_scraper': ('ClinicaUnionMedicaDelNorte', 'dominicanrepublic.json'),
+    'pipeline.scrapers.cr_scraper': ('HospitalCima', 'costarica.json'),
+    'pipeline.scrapers.mx_scraper': ('CentroMedico', 'mexico.json'),
+    'pipeline.scrapers.hospiten': ('Hospiten', 'dominicanrepublic.json'),
+}
+
+PROBE = '''
+import importlib, json, sys, time
+start = time.perf_counter()
+module = importlib.import_module({module!r})
+imported = time.perf_counter() - start
+constructed = error = None
+if {class_name!r}:
+    metadata = json.load(open('pipeline/resources/hospitals_metadata/' + {metadata_file!r}))
+    entry = metadata.get({class_name!r}) or next(m for k, m in metadata.items() if k.startswith({class_name!r}))
+    start = time.perf_counter()
+    try:
+        getattr(module, {class_name!r})(entry)
+    except Exception as e:
+        error = repr(e)[:60]
+    constructed = time.perf_counter() - start
+print(json.dumps({{'import': imported, 'construct': constructed, 'error': error,
+                  'heavy': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def probe(module):
+    class_name, metadata_file = SCRAPERS.get(module, (None, None))
+    code = PROBE.format(module=module, class_name=class_name,
+                        metadata_file=metadata_file, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def main():
+    over_budget = []
+    print(f'{"module":<32} {"import":>8} {"construct":>10} {"budget":>7}  heavy modules loaded')
+    for module, budget in STARTUP_BUDGETS.items():
+        result = probe(module)
+        total = result['import'] + (result['construct'] or 0)
+        construct = f'{result["construct"]:.3f}s' if result['construct'] is not None else '-'
+        eager = [m for m in result['heavy'] if m in LAZY_MODULES]
+        flag = '' if total <= budget else '  OVER BUDGET'
+        if eager:
+            flag += f'  loaded eagerly: {", ".join(eager)}'
+        if result['error']:
+            flag += f'  construct failed: {result["error"]}'
+        print(f'{module:<32} {result["import"]:>7.3f}s {construct:>10} {budget:>6.2f}s  '
+              f'{", ".join(result["heavy"])}{flag}')
+        if total > budget or eager:
+            over_budget.append(module)
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
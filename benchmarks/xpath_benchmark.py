@@ -0,0 +1,60 @@
+""" Micro-benchmark of per-page field extraction: xpath strings re-parsed per page vs a compiled XPathPlan.
+
+Run from the directory containing `pipeline`:
+    python -m pipeline.benchmarks.xpath_benchmark --pages 2000
+"""
+import argparse
+import time
+
+import lxml.html
+from pipeline.common.utils import open_dictionary
+from pipeline.common.xpaths import get_plan
+
+FIXTURES = {
+    'HospitalCima': ('pipeline/benchmarks/fixtures/cima_doctor.html',
+                     'pipeline/resources/hospitals_metadata/costarica.json'),
+}
+
+
+def extract_uncompiled(tree, xpaths):
+    fields = {}
+    for column, xpath in xpaths.items():
+        try:
+            fields[column] = '|'.join(tree.xpath(xpath))
+        except:
+            fields[column] = None
+    return fields
+
+
+def extract_compiled(tree, xpaths):
+    return get_plan(xpaths).extract(tree)
+
+
+def time_per_page(extract, trees, xpaths):
+    start = time.perf_counter()
+    for tree in trees:
+        extract(tree, xpaths)
+    return (time.perf_counter() - start) / len(trees)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=2000)
+    args = parser.parse_args()
+
+    for hospital, (fixture_path, metadata_path) in FIXTURES.items():
+        with open(fixture_path, 'rb') as f:
+            content = f.read()
+        xpaths = open_dictionary(metadata_path)[hospital]['xpaths']
+        trees = [lxml.html.fromstring(content) for _ in range(args.pages)]
+
+        assert extract_uncompiled(trees[0], xpaths) == extract_compiled(trees[0], xpaths)
+        before = time_per_page(extract_uncompiled, trees, xpaths)
+        after = time_per_page(extract_compiled, trees, xpaths)
+        print(f'{hospital} ({len(xpaths)} columns, {args.pages} pages)')
+        print(f'  uncompiled: {before * 1e6:.1f} us/page')
+        print(f'  compiled:   {after * 1e6:.1f} us/page ({before / after:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,14 @@
+import math
 import os
 import re
 
+import numpy as np
 import pandas as pd
+from pipeline.common import sink, utils
+from pipeline.common.registry import IdRegistry
+
+PROVIDERS_REMAPPER_PATH = 'pipeline/resources/providers_remapper.json'
+SPECS_PATH = 'pipeline/resources/cleaning'
 
 
 class Cleaner:
@@ -23,14 +30,278 @@ class DefaultCleaner:
         pass
 
 
+class SpecCleaner:
+    """ Cleans a country's raw files with the column rules of its spec,
+    `resources/cleaning/<country>.json` (see CleaningSpec): adding a country takes a
+    spec file and `SpecCleaner('<country>')` or a subclass setting `country`. """
+    country = None
+
+    def __init__(self, country=None):
+        self.country = country or self.country
+        self.cleaner = CleanerUtils()
+        self.spec = CleaningSpec.load(self.country)
+
+    def clean(self):
+        df = self.cleaner.combine_raw_files(self.country)
+        df = self.cleaner.initial_formatting(df)
+
+        # clean columns
+        df = self.spec.apply(df, self.cleaner)
+
+        return self.cleaner.clean_locations(df, self.spec.country_name, self.spec.drop_columns)
+
+
+class CleaningSpec:
+    """ A country's column cleaning, declared in JSON:
+
+        {"country_name": "Mexico", "drop_columns": ["hoursOperationObj"], "columns": [
+            {"column": "email", "rules": [["astype_str"], ["replace", "mailto:", ""], ...]},
+            {"column": "city", "from": "location", "rules": [["lookup", "<json>", "city", ", "]]},
+            {"column": "name", "drop_rows_containing": ["#Value!,"], "drop_rows_equal": [", "]},
+            {"column": "provider", "stage": "provider"},
+            ...]}
+
+    Entries run in order. "rules" are compiled into one ColumnRules per column,
+    "stage" runs a shared CleanerUtils step (provider, doctor_id) and the drop_rows_*
+    keys filter rows on a column already cleaned.
+    """
+
+    def __init__(self, spec: dict):
+        self.country_name = spec['country_name']
+        self.drop_columns = spec.get('drop_columns', [])
+        self.entries = [(entry, ColumnRules(entry['rules']) if 'rules' in entry else None)
+                        for entry in spec['columns']]
+
+    @classmethod
+    def load(cls, country):
+        return cls(utils.open_dictionary(f'{SPECS_PATH}/{country}.json'))
+
+    def apply(self, df, cleaner) -> pd.DataFrame:
+        for entry, rules in self.entries:
+            column = entry['column']
+            if rules is not None:
+                df[column] = rules.apply(df[entry.get('from', column)])
+            elif entry.get('stage') == 'provider':
+                df[column] = cleaner.clean_provider(df)
+            elif entry.get('stage') == 'doctor_id':
+                df[column] = cleaner.clean_doctorId(df)
+            else:
+                values = df[column].astype(str)
+                keep = pd.Series(True, index=df.index)
+                for text in entry.get('drop_rows_containing', []):
+                    keep &= ~values.str.contains(text, regex=False)
+                for text in entry.get('drop_rows_equal', []):
+                    keep &= values != text
+                df = df[keep].copy()
+        return df
+
+
+class ColumnRules:
+    """ A column's rules compiled into one function of a cell, run once per distinct
+    value of the column instead of one pandas pass per rule.
+
+    Rules are [name, *args] lists (see RULES); regexes are compiled once and runs of
+    character deletions fuse into a single step. Missing cells are None: only
+    fillna, astype_str and map see them, every other rule skips cells that are not
+    strings, like the .str accessor does.
+    """
+
+    def __init__(self, rules):
+        self.rules = _fuse_deletions(rules)
+        self.steps = [RULES[name](*args) for name, *args in self.rules]
+
+    def clean_value(self, value):
+        for step, takes_missing in self.steps:
+            if takes_missing or isinstance(value, str):
+                value = step(value)
+        return value
+
+    def apply(self, column: pd.Series) -> pd.Series:
+        values = column.to_numpy(dtype=object)
+        try:
+            codes, distinct = pd.factorize(values)
+        except TypeError:  # unhashable cells (lists) are cleaned one by one
+            codes, distinct = np.arange(len(values)), values
+        cleaned = np.empty(len(distinct) + 1, dtype=object)
+        for i, value in enumerate(distinct):
+            cleaned[i] = self.clean_value(value)
+        cleaned[-1] = self.clean_value(None)  # factorize codes missing cells -1
+        return pd.Series(cleaned[codes], index=column.index, name=column.name, dtype=object)
+
+
+def _fuse_deletions(rules):
+    """ Turns single-character removals into 'delete' rules and merges consecutive ones:
+    deleting characters one after the other equals deleting them all in one pass. """
+    fused = []
+    for name, *args in rules:
+        if name == 'replace' and len(args[0]) == 1 and args[1] == '':
+            name, args = 'delete', [args[0]]
+        if name == 'delete' and fused and fused[-1][0] == 'delete':
+            fused[-1] = ['delete', fused[-1][1] + args[0]]
+        else:
+            fused.append([name, *args])
+    return fused
+
+
+RULES = {}
+
+
+def _rule(takes_missing=False):
+    """ Registers a rule factory, taking the rule's arguments, under its name without
+    the leading underscore. """
+    def register(factory):
+        def build(*args):
+            return factory(*args), takes_missing
+        RULES[factory.__name__.lstrip('_')] = build
+        return factory
+    return register
+
+
+@_rule()
+def _replace(old, new):
+    return lambda x: x.replace(old, new)
+
+
+@_rule()
+def _sub(pattern, repl):
+    compiled = re.compile(pattern)
+    return lambda x: compiled.sub(repl, x)
+
+
+@_rule()
+def _delete(chars):
+    def delete(x):
+        for char in chars:  # faster than str.translate for a handful of characters
+            x = x.replace(char, '')
+        return x
+    return delete
+
+
+@_rule()
+def _strip(chars=None):
+    return lambda x: x.strip(chars)
+
+
+@_rule()
+def _title():
+    return str.title
+
+
+@_rule(takes_missing=True)
+def _fillna(value):
+    return lambda x: value if x is None else x
+
+
+@_rule(takes_missing=True)
+def _astype_str():
+    return str
+
+
+@_rule(takes_missing=True)
+def _map(mapping):
+    return lambda x: mapping.get(x, x) if isinstance(x, str) else x
+
+
+@_rule()
+def _prefix(text):
+    return lambda x: text + x
+
+
+@_rule()
+def _split_join(sep, joiner, strip_parts=False):
+    if strip_parts:
+        return lambda x: joiner.join(part.strip() for part in x.split(sep))
+    return lambda x: joiner.join(x.split(sep))
+
+
+@_rule()
+def _first_token(sep):
+    return lambda x: x.split(sep)[0]
+
+
+@_rule(takes_missing=True)
+def _clean_name(titles, noise):
+    """ The name kernel, one pass per name: removes the titles pattern, title-cases and
+    strips, removes the noise patterns one after the other (removing one can form the
+    next, as 'Dr,.' gives 'Dr.'; a missing name is ''), collapses double spaces and
+    rejoins the first (larger) and last half of the words, as 'first last'. """
+    titles, noise = re.compile(titles), [re.compile(pattern) for pattern in noise]
+
+    def clean(x):
+        if isinstance(x, str):
+            x = titles.sub('', x).title().strip()
+        elif x is None:
+            x = ''
+        else:
+            return x
+        for pattern in noise:
+            x = pattern.sub('', x)
+        words = x.replace('  ', ' ').split(' ')
+        middle = math.ceil(len(words) / 2)
+        return (' '.join(words[:middle]) + ' ' + ' '.join(words[middle:])).replace('  ', ' ')
+    return clean
+
+
+@_rule()
+def _clean_email(junk):
+    """ The email kernel, one pass per value: removes spaces and quotes, then the junk
+    patterns one after the other (prefixes like mailto:, tabs and newlines, known garbage
+    addresses), joins '|' separated emails by ',' and keeps values with a single @
+    between two non-empty parts, else None. """
+    junk = [re.compile(pattern) for pattern in junk]
+
+    def clean(x):
+        x = x.replace(' ', '').replace("'", '')
+        for pattern in junk:
+            x = pattern.sub('', x)
+        x = x.strip().replace('|', ',')
+        parts = x.split('@')
+        return x if len(parts) == 2 and '' not in parts else None
+    return clean
+
+
+@_rule()
+def _remap_parts(path, sep, joiner):
+    """ Splits on sep and keeps the parts found in the JSON dictionary at path, remapped. """
+    remapper = utils.open_dictionary(path)
+    return lambda x: joiner.join(remapper[part] for part in (p.strip() for p in x.split(sep))
+                                 if part in remapper)
+
+
+@_rule()
+def _lookup(path, field, sep):
+    """ `field` of the entry of the JSON dictionary at path named by the first part of the value. """
+    table = utils.open_dictionary(path)
+    return lambda x: table.get(x.split(sep)[0], {}).get(field)
+
+
 class CleanerUtils:
     def __init__(self):
         pass
 
+    def initial_formatting(self, df):
+        df = df.reset_index().drop(['index'], axis=1)
+        df = df.where(pd.notnull(df), None)
+        df = df.drop_duplicates(subset='name')
+        return df.reset_index().drop(['index'], axis=1)
+
     def combine_raw_files(self, country) -> pd.DataFrame:
+        return pd.concat([sink.read_raw_file(f) for f in self.raw_files(country)])
+
+    def raw_files(self, country):
+        """ Returns the country's raw files, preferring a hospital's NDJSON file over its legacy JSON array. """
         path = f'pipeline/data/{country}'
-        raw_files = [f'{path}/{f}' for f in os.listdir(path) if 'raw' in f and "json" in f]
-        return pd.concat([pd.read_json(f, orient='records') for f in raw_files])
+        names = [f for f in os.listdir(path) if 'raw' in f and f.endswith(('.json', '.jsonl'))]
+        return [f'{path}/{f}' for f in sorted(names)
+                if not (f.endswith('.json') and f + 'l' in names)]
+
+    def iter_raw_records(self, country):
+        """ Lazily yields every raw doctor record of a country, one line at a time for NDJSON files. """
+        for f in self.raw_files(country):
+            if f.endswith('.jsonl'):
+                yield from sink.iter_records(f)
+            else:
+                yield from pd.read_json(f, orient='records').to_dict(orient='records')
 
     def clean_name(self, df):
         """ Cleans name and comma separates first and last. Add patterns to be dropped in name_pattern. """
@@ -43,6 +314,10 @@ class CleanerUtils:
             df['name'].str.split(' ').apply(lambda x: ' '.join(x[len(x)//2:])))
         return first_name + ', ' + last_name
 
+    def clean_provider(self, df):
+        """ Remaps each provider of a row to its canonical names, see normalize_providers. """
+        return normalize_providers(df['provider'], providers_remapper())
+
     def clean_education(self, df):
         def dict_from_string(s):
             try:
@@ -70,11 +345,21 @@ class CleanerUtils:
             .apply(lambda x: [dict_from_string(i) for i in x] if x is not None else x)
         )
 
-    def clean_locations(self, df):
+    def clean_doctorId(self, df):
+        registry = IdRegistry()
+        registry.ids(df.name)
+        registry.flush()
+        return df.name.map(registry.get)
 
+    def clean_locations(self, df, country_name, drop_columns=()):
+        """ Replaces each doctor's location names by the hospitals of locations.csv (and
+        the phone number by theirs), or by an 'External Office' in country_name for
+        doctors without an id; then structures education. """
+        df = df.drop(list(drop_columns), axis=1)
         hospitals = pd.read_csv('pipeline/resources/locations.csv')
-        hospitals['hoursOperation'] = hospitals.hoursOperation.fillna('None').apply(
-            lambda x: eval(x)).apply(lambda x: ', '.join(x) if type(x) == list else x)
+        df = df.where(pd.notnull(df), None)
+        ken = df[df.doctorId.apply(lambda x: x == None)]
+        df = df[df.doctorId.apply(lambda x: x != None)]
 
         inline_hospitals = hospitals[['locationName', 'location', 'city',
                                       'state', 'country', 'zipCode', 'phoneNumber', 'latitude', 'longitude']]
@@ -87,3 +372,87 @@ class CleanerUtils:
         for h in inline_hospital_list:
             hospital = h['locationName']
             d[hospital] = h
+
+        df['phoneNumber'] = (df.location
+                             .astype(str)
+                             .str.split(', ')
+                             .apply(lambda x: [str(d[i]['phoneNumber']) for i in x if i in d])
+                             .apply(lambda x: ', '.join(x))
+                             )
+
+        df['location'] = (df.location
+                          .str.split(', ')
+                          .apply(lambda x: [[d[i] if i in d else x for i in x][0]] if type(x) == list else [])
+                          )
+
+        ken['location'] = (ken.location
+                           .apply(lambda x: [{
+                               'locationName': 'External Office',
+                               'location': x,
+                               'city': None,
+                               'state': None,
+                               'country': country_name,
+                               'zipCode': None,
+                               'phoneNumber': None,
+                               'latitude': None,
+                               'longitude': None,
+                           }])
+                           )
+        df = pd.concat([df, ken])
+
+        df['education'] = self.clean_education(df)
+
+        return df
+
+
+_providers_remapper = None
+
+
+def providers_remapper() -> dict:
+    """ providers_remapper.json, read once per process. """
+    global _providers_remapper
+    if _providers_remapper is None:
+        _providers_remapper = utils.open_dictionary(PROVIDERS_REMAPPER_PATH)
+    return _providers_remapper
+
+
+def normalize_providers(provider: pd.Series, providers: dict) -> pd.Series:
+    """ Turns raw provider strings into sorted, de-duplicated, comma separated canonical names.
+
+    A row is split on '|' and ',' into title-cased parts without spaces, each part is
+    remapped through `providers` (parts remapped to None are dropped, unknown parts
+    kept) and remapped names may list several providers themselves ('A, B'). Missing
+    providers give ''.
+
+    Raw providers repeat a lot (a few hundred distinct strings in Mexico's thousands
+    of doctors), so each distinct string is normalized once: their parts are exploded
+    into one Series, remapped with vectorized string ops and a single map, grouped
+    back, and the result is taken back onto the rows by factorized code.
+    """
+    codes, distinct = pd.factorize(provider.to_numpy(dtype=object))
+    text = pd.Series(distinct, dtype=object)
+
+    parts = (
+        text.str.replace(r'\n|\r', '', regex=True)
+        .str.replace(',', '|', regex=False)
+        .str.title().str.split('|')
+        .explode().str.strip())
+    parts = parts[parts.notna() & ~parts.isin(('And', '', ' '))].str.replace(' ', '', regex=False)
+
+    known = parts.isin(providers.keys())
+    remapped = parts.where(~known, parts.map(providers))
+    names = remapped[~known | remapped.notna()].str.split(', ').explode()
+
+    names = pd.DataFrame({'code': names.index, 'name': names.to_numpy()})
+    names = names.drop_duplicates().sort_values(['code', 'name'], kind='stable')
+    # Each code's names are now one sorted run, joined into its normalized string
+    normalized = np.full(len(distinct), '', dtype=object)
+    if len(names):
+        group_codes = names['code'].to_numpy()
+        starts = np.flatnonzero(np.diff(group_codes)) + 1
+        groups = np.split(names['name'].to_numpy(dtype=object), starts)
+        normalized[group_codes[np.r_[0, starts]]] = [', '.join(group) for group in groups]
+
+    # Missing providers (code -1) take the '' appended at the end
+    result = np.append(normalized, '')[codes]
+    return pd.Series(result, index=provider.index, name=provider.name).str.replace('  ', ' ', regex=False)
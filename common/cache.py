@@ -0,0 +1,169 @@
+import hashlib
+import json
+import time
+
+import requests
+from pipeline.common.sqlite_store import SQLiteStore
+
+CACHE_PATH = 'pipeline/data/cache/responses.sqlite3'
+TTL = 90 * 24 * 60 * 60  # seconds an entry is kept without being refreshed
+MAX_SIZE = 512 * 1024 * 1024  # bytes of cached bodies before least recently used are evicted
+EVICT_EVERY = 1000  # stores between two ttl evictions
+
+
+class ResponseCache(SQLiteStore):
+    """ On-disk HTTP response cache shared by the scrapers and Doctor.
+
+    Entries are keyed by method, url and request body, and only responses carrying
+    an ETag or Last-Modified header are stored. Callers revalidate a stored entry with
+    a conditional request (`conditional_headers`) and, on a 304, rebuild the response
+    from disk (`cached_response`). Each entry can also hold the fields already
+    extracted from its body, so unchanged pages skip the lxml parse.
+    """
+    schema = ('CREATE TABLE IF NOT EXISTS responses ('
+              'key TEXT PRIMARY KEY, url TEXT, status INTEGER, headers TEXT, body BLOB, '
+              'etag TEXT, last_modified TEXT, extracted TEXT, size INTEGER, '
+              'stored_at REAL, accessed_at REAL)')
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_size=MAX_SIZE):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._size = 0  # running total of the stored bodies, summed when connecting
+        self._stores = 0
+
+    @staticmethod
+    def key(method, url, body=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        digest = hashlib.sha256(f'{method.upper()} {url}\n'.encode('utf-8'))
+        digest.update(body or b'')
+        return digest.hexdigest()
+
+    def conditional_headers(self, key) -> dict:
+        """ Returns If-None-Match/If-Modified-Since headers for a stored entry, else {}. """
+        entry = self._get(key)
+        if entry is None:
+            return {}
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def cached_response(self, key, resp: requests.Response) -> requests.Response:
+        """ Turns a 304 for a stored entry into the stored 200 response, marked from_cache. """
+        entry = self._get(key)
+        if entry is None:
+            return resp
+        cached = requests.Response()
+        cached.status_code = entry['status']
+        cached._content = entry['body']
+        cached.headers.update(json.loads(entry['headers']))
+        cached.url = entry['url']
+        cached.encoding = resp.encoding or requests.utils.get_encoding_from_headers(cached.headers)
+        cached.request = resp.request
+        cached.from_cache = True
+        cached.cache_key = key
+        self._execute('UPDATE responses SET accessed_at = ?, stored_at = ? WHERE key = ?',
+                      (time.time(), time.time(), key))
+        return cached
+
+    def store(self, key, resp: requests.Response):
+        """ Stores a 200 response if it has validators to revalidate it with later. """
+        etag = resp.headers.get('ETag')
+        last_modified = resp.headers.get('Last-Modified')
+        if resp.status_code != 200 or not (etag or last_modified):
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            conn.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(key, url, status, headers, body, etag, last_modified, extracted, size, stored_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, NULL, ?, ?, ?)',
+                (key, resp.url, resp.status_code, json.dumps(dict(resp.headers)), resp.content,
+                 etag, last_modified, len(resp.content), now, now))
+            conn.commit()
+            self._size += len(resp.content) - (row[0] if row else 0)
+            self._stores += 1
+            due = self._size > self.max_size or self._stores % EVICT_EVERY == 0
+        resp.cache_key = key
+        if due:
+            self.evict()
+
+    def get_extracted(self, key, fingerprint):
+        """ Returns fields previously extracted from the entry's body with the same
+        extraction fingerprint (e.g. a hash of the xpaths), else None. """
+        entry = self._get(key)
+        if entry is None or entry['extracted'] is None:
+            return None
+        extracted = json.loads(entry['extracted'])
+        if extracted['fingerprint'] != fingerprint:
+            return None
+        return extracted['fields']
+
+    def set_extracted(self, key, fingerprint, fields: dict):
+        self._execute('UPDATE responses SET extracted = ? WHERE key = ?',
+                      (json.dumps({'fingerprint': fingerprint, 'fields': fields}), key))
+
+    def evict(self):
+        """ Drops entries older than ttl, then least recently used ones above max_size.
+        Runs every EVICT_EVERY stores, when the stored bodies exceed max_size and on close. """
+        with self._lock:
+            self._evict(self._connect())
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM responses WHERE stored_at < ?',
+                     (time.time() - self.ttl,))
+        total = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total > self.max_size:
+            rows = conn.execute(
+                'SELECT key, size FROM responses ORDER BY accessed_at').fetchall()
+            for key, size in rows:
+                if total <= self.max_size:
+                    break
+                conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                total -= size
+        conn.commit()
+        self._size = total
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM responses')
+            conn.commit()
+            self._size = 0
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._evict(self._conn)
+        super().close()
+
+    def _get(self, key):
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT url, status, headers, body, etag, last_modified, extracted, stored_at '
+                'FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        columns = ['url', 'status', 'headers', 'body', 'etag',
+                   'last_modified', 'extracted', 'stored_at']
+        entry = dict(zip(columns, row))
+        if entry['stored_at'] < time.time() - self.ttl:
+            return None
+        return entry
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(sql, params)
+            conn.commit()
+
+    def _opened(self, conn):
+        self._size = conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pipeline.common import sessions, telemetry
+
+DEFAULT_CONCURRENCY = 8
+
+
+class Frontier:
+    """ Thread-safe set of urls already queued, so a doctor listed on several
+    index pages (e.g. under several specialties) is only fetched once. """
+
+    def __init__(self):
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def add(self, url) -> bool:
+        """ Adds url and returns True if it had not been seen before. """
+        with self._lock:
+            if url in self._seen:
+                return False
+            self._seen.add(url)
+            return True
+
+    def __len__(self):
+        return len(self._seen)
+
+
+async def aiter_urls(urls):
+    """ Iterates a list or an async iterable of urls asynchronously. """
+    if hasattr(urls, '__aiter__'):
+        async for url in urls:
+            yield url
+    else:
+        for url in urls:
+            yield url
+
+
+async def iter_completed(urls, work, concurrency=DEFAULT_CONCURRENCY):
+    """ Async generator running work(url) on worker threads for a list or async iterable
+    of urls and yielding (index, url, result) as each finishes. New urls are started
+    while earlier ones are still running, but at most `concurrency` results are running
+    or waiting to be consumed, so a slow consumer holds back the fetches instead of
+    piling up results. A url whose work raises is printed and skipped; an error of the
+    url iterator is raised once the results before it are yielded. """
+    loop = asyncio.get_running_loop()
+    results = asyncio.Queue(maxsize=concurrency)
+    slots = asyncio.Semaphore(concurrency)  # released when a result is consumed
+    running = set()
+    done = object()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        async def run(index, url):
+            try:
+                result = await loop.run_in_executor(executor, work, url)
+            except Exception as e:
+                print(e)
+                slots.release()
+                return
+            await results.put((index, url, result))
+
+        async def produce():
+            try:
+                index = 0
+                async for url in aiter_urls(urls):
+                    await slots.acquire()
+                    task = asyncio.ensure_future(run(index, url))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                    index += 1
+                if running:
+                    await asyncio.gather(*running)
+            finally:
+                await results.put(done)
+
+        producer = asyncio.ensure_future(produce())
+        try:
+            while True:
+                item = await results.get()
+                if item is done:
+                    break
+                slots.release()
+                yield item
+            await producer  # raises the error of the url iterator, if any
+        finally:
+            producer.cancel()
+            for task in list(running):
+                task.cancel()
+
+
+async def iter_fetched(urls, parse, concurrency=DEFAULT_CONCURRENCY):
+    """ Fetches urls concurrently through the shared sessions and yields
+    (index, url, parse(response)) as pages arrive. """
+    def fetch_and_parse(url):
+        resp = sessions.get(url)
+        start = time.perf_counter()
+        try:
+            return parse(resp)
+        finally:
+            telemetry.record_parse('index', time.perf_counter() - start)
+
+    async for item in iter_completed(urls, fetch_and_parse, concurrency):
+        yield item
+
+
+async def iter_links(index_urls, extract_links, frontier=None, concurrency=DEFAULT_CONCURRENCY):
+    """ Two-level crawl: fetches index pages (specialties, alphabet letters, ...) concurrently
+    and yields each link found by extract_links(response) as soon as its page arrives,
+    skipping links already in the frontier. Feed the result straight into
+    AsyncDoctorFetcher so doctor pages are fetched while index pages are still loading. """
+    frontier = frontier if frontier is not None else Frontier()
+    async for _, _, links in iter_fetched(index_urls, extract_links, concurrency):
+        for link in links:
+            if frontier.add(link):
+                yield link
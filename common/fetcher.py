@@ -0,0 +1,98 @@
+import asyncio
+
+import pandas as pd
+import tqdm
+from pipeline.common.crawler import iter_completed
+from pipeline.models.doctor import Doctor, DoctorBatch
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_CHUNK_SIZE = 200
+
+
+class AsyncDoctorFetcher:
+    """ Fetches and extracts one-page-per-doctor directories concurrently.
+
+    Each url is turned into a Doctor with the 'static' strategy on a worker thread,
+    at most `concurrency` pages in flight per host. A failing url is printed and
+    skipped, like the sequential scrape loops it replaces.
+
+    If metadata['fingerprints'] holds a FingerprintStore, pages whose content is
+    unchanged since the last run are skipped too, so only new or changed doctors
+    are returned. If metadata['sink'] holds an NDJSONSink, doctors are written to it
+    in chunks as they arrive instead of being kept in memory. Urls in
+    metadata['resume'] (already in the sink of a resumed scrape) are not fetched.
+    """
+
+    def __init__(self, metadata: dict, concurrency=None):
+        self.metadata = metadata
+        self.concurrency = int(
+            concurrency or metadata.get('concurrency', DEFAULT_CONCURRENCY))
+        self.chunk_size = int(metadata.get('chunk_size', DEFAULT_CHUNK_SIZE))
+
+    async def iter_doctors(self, doctor_urls):
+        """ Async generator yielding (index, DoctorRecord) as pages arrive.
+        doctor_urls may be a list or an async iterable still being crawled. """
+        async for index, _, record in iter_completed(doctor_urls, self._extract, self.concurrency):
+            if record is not None:
+                yield index, record
+
+    def scrape(self, doctor_urls, desc='Scraping doctors', transform=None) -> pd.DataFrame:
+        """ Scrapes every url and returns the doctors as a DataFrame, in url order,
+        after applying transform (e.g. translation) to it.
+
+        When streaming to metadata['sink'], transform is applied to each chunk of
+        chunk_size doctors before it is written, and an empty DataFrame is returned.
+        """
+        if not hasattr(doctor_urls, '__aiter__'):
+            doctor_urls = list(doctor_urls)
+        sink = self.metadata.get('sink')
+        if sink is not None:
+            asyncio.run(self._stream(doctor_urls, desc, sink, transform))
+            return pd.DataFrame()
+        df = asyncio.run(self._collect(doctor_urls, desc)).to_frame()
+        return transform(df) if transform is not None else df
+
+    async def _collect(self, doctor_urls, desc) -> DoctorBatch:
+        doctors = []
+        with tqdm.tqdm(total=_total(doctor_urls), desc=desc) as progress:
+            async for index, record in self.iter_doctors(doctor_urls):
+                doctors.append((index, record))
+                progress.update()
+        return DoctorBatch(record for _, record in sorted(doctors, key=lambda x: x[0]))
+
+    async def _stream(self, doctor_urls, desc, sink, transform):
+        loop = asyncio.get_running_loop()
+        chunk = []
+        with tqdm.tqdm(total=_total(doctor_urls), desc=desc) as progress:
+            async for _, record in self.iter_doctors(doctor_urls):
+                chunk.append(record)
+                progress.update()
+                if len(chunk) >= self.chunk_size:
+                    await loop.run_in_executor(None, self._write_chunk, sink, chunk, transform)
+                    chunk = []
+        if chunk:
+            await loop.run_in_executor(None, self._write_chunk, sink, chunk, transform)
+
+    def _write_chunk(self, sink, chunk, transform):
+        df = DoctorBatch(chunk).to_frame()
+        if transform is not None:
+            df = transform(df)
+        sink.write_df(df)
+
+    def _extract(self, url):
+        if url in self.metadata.get('resume', ()):
+            return None
+        fingerprints = self.metadata.get('fingerprints')
+        previous_fingerprint = fingerprints.get(url) if fingerprints is not None else None
+        doctor = Doctor(self.metadata, 'static', url,
+                        previous_fingerprint=previous_fingerprint)
+        record = doctor.extract()
+        if doctor.unchanged:
+            return None
+        if fingerprints is not None:
+            fingerprints.update(url, doctor.fingerprint)
+        return record
+
+
+def _total(doctor_urls):
+    return len(doctor_urls) if hasattr(doctor_urls, '__len__') else None
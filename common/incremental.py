@@ -0,0 +1,98 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+import pipeline.paths
+from pipeline.common import sink, utils
+
+REFRESH_AFTER_DAYS = 7
+
+
+class FingerprintStore:
+    """ Content fingerprint of every doctor page scraped for a hospital, keyed by url.
+
+    Set as metadata['fingerprints'] to make AsyncDoctorFetcher skip pages whose
+    content has not changed since the last run. `used` tells whether the scraper
+    went through the fetcher, `removed` lists urls no longer in the directory.
+    """
+
+    def __init__(self, country, hospital_short_name):
+        self.path = f'{pipeline.paths.FINGERPRINTS_PATH}/{country}_{hospital_short_name}.json'
+        self.fingerprints = utils.open_dictionary(self.path) if os.path.isfile(self.path) else {}
+        self.seen = set()
+        self.removed = []
+        self.used = False
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        with self._lock:
+            self.used = True
+            self.seen.add(url)
+            return self.fingerprints.get(url)
+
+    def update(self, url, fingerprint):
+        with self._lock:
+            self.fingerprints[url] = fingerprint
+
+    def finish_run(self):
+        """ Forgets urls that were not seen this run and records them in removed. """
+        with self._lock:
+            self.removed = [url for url in self.fingerprints if url not in self.seen]
+            for url in self.removed:
+                del self.fingerprints[url]
+
+    def save(self):
+        if not os.path.isdir(pipeline.paths.FINGERPRINTS_PATH):
+            os.makedirs(pipeline.paths.FINGERPRINTS_PATH)
+        utils.save_dictionary(self.fingerprints, self.path)
+
+
+def is_stale(country, hospital_short_name, refresh_after_days=REFRESH_AFTER_DAYS):
+    """ True if the hospital's raw date in data/index.json is missing or older than refresh_after_days. """
+    index = utils.open_dictionary(pipeline.paths.INDEX_PATH)
+    raw_date = index.get(country, {}).get('raw', {}).get(hospital_short_name)
+    if raw_date is None:
+        return True
+    age = datetime.utcnow() - datetime.strptime(raw_date, '%Y%m%d')
+    return age.days >= refresh_after_days
+
+
+def scrape_incremental(scraper_class, metadata: dict, refresh_after_days=REFRESH_AFTER_DAYS, force=False, update_index=True):
+    """ Scrapes a hospital only if its raw file is stale, re-extracting only new or changed
+    doctors. They are appended to the NDJSON raw file under a new revision, together with
+    tombstones for doctors that left the directory, so the file is never rewritten.
+    Scrapers that do not go through AsyncDoctorFetcher fall back to merging the doctors
+    they return into the raw file; if they return none, the raw file is left as it is.
+    Pass update_index=False when several processes scrape at once and the caller updates it.
+
+    Returns: number of new or changed doctors, or None if the hospital was fresh
+    """
+    country, short_name = metadata['country'], metadata['hospital_short_name']
+    if not force and not is_stale(country, short_name, refresh_after_days):
+        print(f'{metadata["hospital_name"]} raw data is fresh, skipping')
+        return None
+
+    path = sink.migrate_raw_file(country, short_name)
+    store = FingerprintStore(country, short_name)
+    revision = time.time()
+    with sink.NDJSONSink(path, revision=revision) as raw_sink:
+        df = scraper_class(dict(metadata, fingerprints=store, sink=raw_sink)).scrape()
+        if store.used:
+            store.finish_run()
+            for url in store.removed:
+                raw_sink.remove(url)
+            changed = raw_sink.count - len(store.removed)
+
+    if store.used:
+        store.save()
+        print(f'{metadata["hospital_name"]}: {changed} new or changed, {len(store.removed)} removed')
+    elif df is None or df.empty:
+        print(f'Error: {metadata["hospital_name"]} returned no doctors, keeping its raw file')
+        return 0
+    else:
+        changed = len(df)
+        sink.merge_raw_file(path, df, revision)
+    if update_index:
+        utils.update_index('raw', country, short_name)
+    return changed
@@ -0,0 +1,188 @@
+import importlib
+import os
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from pipeline.common import ratelimit, sessions, sink, telemetry, utils
+from pipeline.common.incremental import scrape_incremental
+
+METADATA_PATH = 'pipeline/resources/hospitals_metadata'
+COUNTRIES = {
+    'mx': ('mexico.json', 'pipeline.scrapers.mx_scraper'),
+    'cr': ('costarica.json', 'pipeline.scrapers.cr_scraper'),
+    'dr': ('dominicanrepublic.json', 'pipeline.scrapers.dr_scraper'),
+}
+FAILURE_POLICIES = ('continue', 'retry', 'abort')
+
+
+def find_hospitals(countries=None, hospitals=None) -> list:
+    """ Returns (country, class_name, metadata) for every hospital in the metadata files,
+    optionally filtered by country code and by class name or hospital_short_name. """
+    jobs = []
+    for country, (metadata_file, _) in COUNTRIES.items():
+        if countries and country not in countries:
+            continue
+        country_metadata = utils.open_dictionary(f'{METADATA_PATH}/{metadata_file}')
+        for class_name, metadata in country_metadata.items():
+            if hospitals and class_name not in hospitals and metadata['hospital_short_name'] not in hospitals:
+                continue
+            jobs.append((country, class_name, metadata))
+    return jobs
+
+
+def resolve_scraper(country, class_name):
+    """ Returns the scraper class for a metadata entry. Hospiten hospitals (HospitenCancun,
+    HospitenBavaro, ...) share the Hospiten class; None if no scraper exists yet. """
+    if class_name.startswith('Hospiten'):
+        return importlib.import_module('pipeline.scrapers.hospiten').Hospiten
+    module = importlib.import_module(COUNTRIES[country][1])
+    scraper_class = getattr(module, class_name, None)
+    return scraper_class if hasattr(scraper_class, 'scrape') else None
+
+
+def run_hospital(country, class_name, metadata, concurrency=None, incremental=False, force=False):
+    """ Scrapes one hospital into its raw file. Runs in a worker process.
+
+    Returns: dict with hospital, status ('ok', 'skipped', 'failed'), doctors, seconds, error
+    and the telemetry report of the scrape
+    """
+    result = {'country': country, 'hospital': class_name,
+              'short_name': metadata['hospital_short_name'], 'status': 'ok',
+              'doctors': 0, 'seconds': 0.0, 'error': None, 'telemetry': None}
+    start = time.perf_counter()
+    try:
+        scraper_class = resolve_scraper(country, class_name)
+        if scraper_class is None:
+            result['status'] = 'skipped'
+            result['error'] = 'no scraper class'
+            return result
+        telemetry.begin(f'{country}/{metadata["hospital_short_name"]}')
+        ratelimit.configure_from_metadata(metadata)
+        if concurrency:
+            metadata = dict(metadata, concurrency=concurrency)
+            sessions.configure(pool_size=max(sessions.POOL_SIZE, int(concurrency)))
+
+        if incremental:
+            doctors = scrape_incremental(
+                scraper_class, metadata, force=force, update_index=False)
+            if doctors is None:
+                result['status'] = 'skipped'
+                result['error'] = 'fresh'
+            result['doctors'] = doctors or 0
+        else:
+            result['doctors'] = sink.scrape_to_raw_file(scraper_class, metadata)
+    except Exception as e:
+        traceback.print_exc()
+        result['status'] = 'failed'
+        result['error'] = repr(e)
+    result['seconds'] = time.perf_counter() - start
+    result['telemetry'] = telemetry.end(result['doctors'])
+    return result
+
+
+class Orchestrator:
+    """ Runs hospital scrapers in parallel worker processes, so a refresh of every
+    country takes about as long as the slowest hospital.
+
+    on_failure is one of:
+        'continue' - record the failure and keep going
+        'retry'    - resubmit a failed hospital up to `retries` times
+        'abort'    - cancel hospitals not yet started after the first failure
+
+    The telemetry of every hospital is written to `scrape_telemetry.json` in today's
+    exports folder, and to `scrape_telemetry.prom` as well if prometheus is set.
+    """
+
+    def __init__(self, workers=None, concurrency=None, on_failure='continue', retries=1,
+                 incremental=False, force=False, prometheus=False):
+        if on_failure not in FAILURE_POLICIES:
+            raise ValueError(f'on_failure must be one of {FAILURE_POLICIES}')
+        self.workers = workers
+        self.concurrency = concurrency
+        self.on_failure = on_failure
+        self.retries = retries
+        self.incremental = incremental
+        self.force = force
+        self.prometheus = prometheus
+
+    def run(self, jobs) -> list:
+        """ Scrapes every (country, class_name, metadata) job and returns their results. """
+        results = []
+        attempts = {}
+        start = time.perf_counter()
+        jobs = share_host_budgets(jobs, self.workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending = {self._submit(executor, job): job for job in jobs}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'country': job[0], 'hospital': job[1],
+                                  'short_name': job[2]['hospital_short_name'], 'status': 'failed',
+                                  'doctors': 0, 'seconds': 0.0, 'error': repr(e), 'telemetry': None}
+                    if result['status'] == 'failed':
+                        attempts[job[1]] = attempts.get(job[1], 0) + 1
+                        if self.on_failure == 'retry' and attempts[job[1]] <= self.retries:
+                            print(f'Retrying {job[1]}: {result["error"]}')
+                            pending[self._submit(executor, job)] = job
+                            continue
+                        if self.on_failure == 'abort':
+                            for other in pending:
+                                other.cancel()
+                    elif result['status'] == 'ok':
+                        utils.update_index('raw', result['country'], result['short_name'])
+                    results.append(result)
+                if self.on_failure == 'abort' and any(r['status'] == 'failed' for r in results):
+                    pending = {f: j for f, j in pending.items() if not f.cancelled()}
+
+        self.report(results, time.perf_counter() - start)
+        reports = [r['telemetry'] for r in results if r['telemetry'] is not None]
+        if reports:
+            print(f'Telemetry saved to {telemetry.save_report(reports, utils.export_folder(), self.prometheus)}')
+        return results
+
+    def report(self, results, wall_time):
+        for r in sorted(results, key=lambda r: r['seconds'], reverse=True):
+            error = f' ({r["error"]})' if r['error'] else ''
+            print(f'{r["country"]} {r["hospital"]:<28} {r["status"]:<8} '
+                  f'{r["doctors"]:>6} doctors {r["seconds"]:>8.1f}s{_time_split(r["telemetry"])}{error}')
+        total = sum(r['seconds'] for r in results)
+        print(f'Wall clock {wall_time:.1f}s for {total:.1f}s of scraping '
+              f'({len([r for r in results if r["status"] == "failed"])} failed)')
+
+    def _submit(self, executor, job):
+        country, class_name, metadata = job
+        return executor.submit(run_hospital, country, class_name, metadata,
+                               self.concurrency, self.incremental, self.force)
+
+
+def share_host_budgets(jobs, workers) -> list:
+    """ Each worker process has its own limiter per host, so hospitals on the same host
+    (the Hospiten hospitals on hospiten.com) would together send their rate_limit once
+    per worker. Their rate_limit is divided by the number of them that can run at once. """
+    per_host = {}
+    for _, _, metadata in jobs:
+        for host in (metadata.get('rate_limit') or {}).get('hosts', []):
+            per_host[host] = per_host.get(host, 0) + 1
+    shared = []
+    for country, class_name, metadata in jobs:
+        rate_limit = metadata.get('rate_limit') or {}
+        running = min(workers, max([per_host[host] for host in rate_limit.get('hosts', [])], default=1))
+        if running > 1:
+            metadata = dict(metadata, rate_limit=ratelimit.share_rate_limit(rate_limit, running))
+        shared.append((country, class_name, metadata))
+    return shared
+
+
+def _time_split(report):
+    """ ' (fetch 120.5s, parse 4.2s)': time spent on the network and in parsing, summed
+    over the worker threads, so it can exceed the wall clock time. """
+    if not report or not report['stages']:
+        return ''
+    fetch = sum(s['fetch_total_seconds'] for s in report['stages'].values())
+    parse = sum(s['parse_total_seconds'] for s in report['stages'].values())
+    return f' (fetch {fetch:.1f}s, parse {parse:.1f}s)'
@@ -0,0 +1,50 @@
+import json
+import time
+
+from pipeline.common.sqlite_store import SQLiteStore
+
+PLACES_CACHE_PATH = 'pipeline/data/cache/places.sqlite3'
+TTL = 30 * 24 * 60 * 60  # seconds a geocode or place result is reused before asking Google again
+
+
+class PlacesCache(SQLiteStore):
+    """ On-disk store of Google Maps API results for Locations.
+
+    Maps responses carry no ETag, so the ResponseCache cannot revalidate them; results
+    are instead kept for `ttl` seconds under a kind ('geocode' or 'details') and a key
+    (the address query or the place_id with its fields). The hospitals of
+    locations_metadata.json barely change between runs.
+    """
+    schema = ('CREATE TABLE IF NOT EXISTS places ('
+              'kind TEXT, key TEXT, result TEXT, stored_at REAL, PRIMARY KEY (kind, key))')
+
+    def __init__(self, path=PLACES_CACHE_PATH, ttl=TTL):
+        super().__init__(path)
+        self.ttl = ttl
+
+    def get(self, kind, key):
+        """ Returns the stored result, or None if missing or older than ttl. """
+        with self._lock:
+            row = self._connect().execute(
+                'SELECT result FROM places WHERE kind = ? AND key = ? AND stored_at >= ?',
+                (kind, key, time.time() - self.ttl)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def store(self, kind, key, result: dict):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('INSERT OR REPLACE INTO places (kind, key, result, stored_at) VALUES (?, ?, ?, ?)',
+                         (kind, key, json.dumps(result), time.time()))
+            conn.commit()
+
+    def evict(self):
+        """ Drops entries older than ttl. """
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM places WHERE stored_at < ?', (time.time() - self.ttl,))
+            conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM places').fetchone()[0]
+
@@ -0,0 +1,145 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+DEFAULT_RATE = 10.0  # requests per second
+DEFAULT_BURST = 10
+DEFAULT_CONCURRENCY = 4
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+LATENCY_TARGET = 5.0  # seconds, slower responses count as congestion
+BACKOFF = 5.0  # seconds paused after a 429/503 without Retry-After
+DECREASE_FACTOR = 0.5
+THROTTLED_STATUSES = (429, 503)
+
+
+class HostLimiter:
+    """ Politeness limiter for one host: a token bucket caps the request rate, and an
+    AIMD window caps requests in flight.
+
+    Every healthy response widens the window by 1/window (about +1 per window of
+    responses); a 429, a 5xx, a failed request or a response slower than latency_target
+    halves it. A 429/503 also pauses the host for Retry-After (or `backoff`) seconds.
+    """
+
+    def __init__(self, rate=DEFAULT_RATE, burst=DEFAULT_BURST, concurrency=DEFAULT_CONCURRENCY,
+                 min_concurrency=MIN_CONCURRENCY, max_concurrency=MAX_CONCURRENCY,
+                 latency_target=LATENCY_TARGET, backoff=BACKOFF):
+        self.rate = float(rate) if rate else None
+        self.burst = float(burst)
+        self.window = float(concurrency)
+        self.min_concurrency = float(min_concurrency)
+        self.max_concurrency = float(max_concurrency)
+        self.latency_target = float(latency_target)
+        self.backoff = float(backoff)
+        self.tokens = self.burst
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.stats = {'requests': 0, 'throttled': 0, 'errors': 0, 'slow': 0}
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """ Blocks until a token is available, the window has room and the host is not paused. """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.paused_until - now
+                if wait <= 0 and self.in_flight < max(int(self.window), 1):
+                    if self.rate is None or self.tokens >= 1:
+                        self.tokens -= 1 if self.rate is not None else 0
+                        self.in_flight += 1
+                        self.stats['requests'] += 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+                self._condition.wait(timeout=wait if wait > 0 else None)
+
+    def release(self, status=None, latency=None, retry_after=None):
+        """ Records the outcome of a request: its status code (None if it failed) and latency. """
+        with self._condition:
+            self.in_flight -= 1
+            if status in THROTTLED_STATUSES:
+                self.stats['throttled'] += 1
+                pause = retry_after if retry_after is not None else self.backoff
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+                self._decrease()
+            elif status is None or status >= 500:
+                self.stats['errors'] += 1
+                self._decrease()
+            elif latency is not None and latency > self.latency_target:
+                self.stats['slow'] += 1
+                self._decrease()
+            else:
+                self.window = min(self.max_concurrency, self.window + 1 / self.window)
+            self._condition.notify_all()
+
+    def _decrease(self):
+        self.window = max(self.min_concurrency, self.window * DECREASE_FACTOR)
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+
+_limiters = {}
+_limits = {}
+_lock = threading.Lock()
+
+
+def host_of(url):
+    return urlsplit(url).hostname or ''
+
+
+def get_limiter(url) -> HostLimiter:
+    """ Returns the shared limiter for the url's host, creating it from its configured limits. """
+    host = host_of(url)
+    with _lock:
+        if host not in _limiters:
+            _limiters[host] = HostLimiter(**_limits.get(host, {}))
+        return _limiters[host]
+
+
+def configure_host(host, **limits):
+    """ Sets the limits (HostLimiter arguments) for a host. An existing limiter is replaced
+    only if the limits changed, so a running scrape keeps its learned window. """
+    with _lock:
+        if _limits.get(host) != limits or host not in _limiters:
+            _limits[host] = limits
+            _limiters[host] = HostLimiter(**limits)
+
+
+def configure_from_metadata(metadata: dict):
+    """ Applies a hospital's `rate_limit` metadata, e.g.
+    {"hosts": ["hospiten.com"], "rate": 5, "max_concurrency": 8}, to each of its hosts. """
+    rate_limit = dict(metadata.get('rate_limit') or {})
+    hosts = rate_limit.pop('hosts', [])
+    for host in hosts:
+        configure_host(host, **rate_limit)
+
+
+def share_rate_limit(rate_limit: dict, jobs) -> dict:
+    """ Splits a `rate_limit` between `jobs` processes scraping its hosts at once, each
+    with its own limiter: rate, burst and concurrency are divided between them so that
+    together they keep to the configured budget. """
+    if jobs <= 1 or not rate_limit:
+        return rate_limit
+    shared = dict(rate_limit)
+    rate = rate_limit.get('rate', DEFAULT_RATE)
+    if rate:
+        shared['rate'] = rate / jobs
+    shared['burst'] = max(1.0, rate_limit.get('burst', DEFAULT_BURST) / jobs)
+    shared['max_concurrency'] = max(1, int(rate_limit.get('max_concurrency', MAX_CONCURRENCY) // jobs))
+    shared['concurrency'] = max(1, min(int(rate_limit.get('concurrency', DEFAULT_CONCURRENCY) // jobs),
+                                       shared['max_concurrency']))
+    shared['min_concurrency'] = min(rate_limit.get('min_concurrency', MIN_CONCURRENCY), shared['concurrency'])
+    return shared
+
+
+def parse_retry_after(value):
+    """ Seconds from a Retry-After header given in seconds; None for dates or missing headers. """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
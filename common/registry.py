@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: flushes are atomic but not serialized across processes
+    fcntl = None
+
+UUIDS_PATH = 'pipeline/resources/uuids.json'
+
+
+class IdRegistry:
+    """ In-memory view of uuids.json, the stable id of every location and doctor name.
+
+    The file is read once; ids of new names are generated in memory (thread-safe) and
+    written by a single flush(). A flush holds an exclusive lock on `<path>.lock`,
+    re-reads the file, adds only the names still missing from it and replaces it
+    atomically, so jobs of several countries running at once never lose each other's
+    ids. If another process assigned an id to the same name first, that id wins and
+    is what the registry returns from then on.
+    """
+
+    def __init__(self, path=UUIDS_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids = _read(path)
+        self._new = {}
+
+    def get(self, name) -> str:
+        """ Returns the id of name, assigning a new uuid4 if it has none. """
+        with self._lock:
+            if name not in self._ids:
+                self._ids[name] = self._new[name] = str(uuid.uuid4())
+            return self._ids[name]
+
+    def ids(self, names) -> list:
+        return [self.get(name) for name in names]
+
+    def __contains__(self, name):
+        with self._lock:
+            return name in self._ids
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ids)
+
+    def flush(self) -> int:
+        """ Merges the new ids into the file, returns how many were written. """
+        with self._lock:
+            if not self._new:
+                return 0
+            with open(f'{self.path}.lock', 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                ids = _read(self.path)
+                added = {name: i for name, i in self._new.items() if name not in ids}
+                ids.update(added)
+                tmp_path = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(json.dumps(ids))
+                os.replace(tmp_path, self.path)
+            self._ids = ids
+            self._new = {}
+            return len(added)
+
+
+def _read(path) -> dict:
+    if not os.path.isfile(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,131 @@
+import hashlib
+import json
+import re
+import threading
+import zipfile
+from urllib.parse import urlsplit, urlunsplit
+
+from pipeline.common.cache import ResponseCache
+from pipeline.common.standin import StandInServer
+
+COPY_PARAM = '_copy'  # query parameter ignored on replay, to serve one page under many urls
+ARCHIVE_PATH = 'pipeline/benchmarks/fixtures/archives'
+
+
+class HTTPArchive:
+    """ Compact archive of recorded HTTP responses, for running scrapers offline.
+
+    Saved as a zip holding `index.json` (method, url, status and content type of every
+    request, keyed like the ResponseCache) and one deflated blob per distinct body, so
+    pages repeated under several urls are stored once.
+
+    Record:
+        archive = HTTPArchive()
+        sessions.configure(cache=None, archive=archive)
+        HospitalCima(metadata).scrape()
+        archive.save(f'{ARCHIVE_PATH}/cr_cima.zip')
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.blobs = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        archive = cls()
+        with zipfile.ZipFile(path) as f:
+            archive.entries = json.loads(f.read('index.json'))
+            for entry in archive.entries.values():
+                if entry['blob'] not in archive.blobs:
+                    archive.blobs[entry['blob']] = f.read(f'blobs/{entry["blob"]}')
+        return archive
+
+    def save(self, path):
+        with self._lock, zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as f:
+            f.writestr('index.json', json.dumps(self.entries, indent=1))
+            for blob, content in self.blobs.items():
+                f.writestr(f'blobs/{blob}', content)
+
+    def record(self, method, url, body, resp):
+        self.add(method, url, resp.content, resp.status_code,
+                 resp.headers.get('Content-Type', 'text/html'), body)
+
+    def add(self, method, url, content: bytes, status=200, content_type='text/html; charset=utf-8', body=None):
+        blob = hashlib.sha1(content).hexdigest()
+        entry = {'method': method.upper(), 'url': url, 'status': status,
+                 'content_type': content_type, 'blob': blob}
+        with self._lock:
+            self.entries[ResponseCache.key(method, url, body)] = entry
+            self.blobs[blob] = content
+
+    def lookup(self, method, url, body=None):
+        """ Returns (status, content_type, content) recorded for a request, else None. """
+        entry = self.entries.get(ResponseCache.key(method, strip_copy(url), body or None))
+        if entry is None:
+            return None
+        return entry['status'], entry['content_type'], self.blobs[entry['blob']]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ReplayServer(StandInServer):
+    """ Stand-in server answering from an HTTPArchive. SessionPool sends every request
+    to it when configured with `replay=server`, with the original url in the path.
+
+    With `scale`, the body of every recorded HTML page is repeated `scale` times, so a
+    list page (all doctors on one page) becomes a directory `scale` times larger.
+    """
+
+    def __init__(self, archive: HTTPArchive, latency=0.0, scale=1):
+        super().__init__(latency=latency)
+        self.archive = archive
+        self.scale = scale
+        self.missing = []
+
+    def proxy_url(self, url):
+        """ 'https://host/path?q' -> 'http://127.0.0.1:port/https/host/path?q' """
+        parts = urlsplit(url)
+        return urlunsplit(('http', urlsplit(self.base_url).netloc,
+                           f'/{parts.scheme}/{parts.netloc}{parts.path}', parts.query, ''))
+
+    def original_url(self, path):
+        scheme, _, rest = path.lstrip('/').partition('/')
+        return f'{scheme}://{rest}'
+
+    def respond(self, method, path, headers, body):
+        url = self.original_url(path)
+        recorded = self.archive.lookup(method, url, body)
+        if recorded is None:
+            with self._lock:
+                self.missing.append(url)
+            return 404, {}, b'Not Found'
+        status, content_type, content = recorded
+        if self.scale > 1 and 'html' in content_type:
+            content = repeat_body(content, self.scale)
+        return status, {'Content-Type': content_type}, content
+
+
+_COPY = re.compile(rf'[?&]{COPY_PARAM}=\d+$')
+
+
+def strip_copy(url):
+    """ Removes the COPY_PARAM copy_url appended, leaving the rest of the url untouched. """
+    return _COPY.sub('', url)
+
+
+def copy_url(url, copy):
+    """ The url of the copy-th synthetic duplicate of a page. """
+    separator = '&' if urlsplit(url).query else '?'
+    return f'{url}{separator}{COPY_PARAM}={copy}' if copy else url
+
+
+_BODY = re.compile(rb'(<body[^>]*>)(.*)(</body>)', re.S | re.I)
+
+
+def repeat_body(content: bytes, times):
+    match = _BODY.search(content)
+    if match is None:
+        return content
+    return content[:match.start(2)] + match.group(2) * times + content[match.end(2):]
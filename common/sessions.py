@@ -0,0 +1,190 @@
+import itertools
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from pipeline.common import ratelimit, telemetry
+from pipeline.common.cache import ResponseCache
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 10
+TIMEOUT = (10, 30)  # (connect, read) seconds
+USER_AGENT_POOL_SIZE = 20
+THROTTLE_RETRIES = 2  # resends of a request answered with 429/503, after the host's pause
+FALLBACK_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+
+class SessionPool:
+    """ Keeps one keep-alive requests.Session per host, so every page fetched
+    from the same hospital reuses pooled TCP/TLS connections, and rotates through
+    a User-Agent pool generated once instead of once per request. With a
+    ResponseCache, stored responses are revalidated with conditional requests.
+    Every request waits on its host's ratelimit.HostLimiter, which all scrapers share.
+
+    With an `archive` (replay.HTTPArchive), every response is recorded into it; with a
+    `replay` server (replay.ReplayServer), every request is answered by it instead of
+    the live site, so scrapers run offline against recorded pages. """
+
+    def __init__(self, pool_size=POOL_SIZE, timeout=TIMEOUT, user_agent_pool_size=USER_AGENT_POOL_SIZE, cache=None,
+                 archive=None, replay=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.cache = cache
+        self.archive = archive
+        self.replay = replay
+        self.user_agents = self._generate_user_agents(user_agent_pool_size)
+        self._user_agent_cycle = itertools.cycle(self.user_agents)
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def session(self, url) -> requests.Session:
+        """ Returns the shared session for the url's host, creating it on first use. """
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._sessions:
+                self._sessions[host] = self._new_session()
+            return self._sessions[host]
+
+    def user_agent(self):
+        with self._lock:
+            return next(self._user_agent_cycle)
+
+    def request(self, method, url, **kwargs) -> requests.Response:
+        """ Sends a request through the host's pooled session. A User-Agent from the
+        rotation pool is added unless the caller sets one. Responses served from the
+        cache after a 304 have `from_cache` set to True. A 429/503 is resent up to
+        THROTTLE_RETRIES times once the host's limiter has backed off. `stage` labels
+        the request in the scrape telemetry ('index', 'doctor' or 'geocode'). """
+        stage = kwargs.pop('stage', 'index')
+        headers = {'User-Agent': self.user_agent()}
+        headers.update(kwargs.pop('headers', None) or {})
+        kwargs.setdefault('timeout', self.timeout)
+        body = kwargs.get('data')
+        if body is None and kwargs.get('json') is not None:
+            body = json.dumps(kwargs['json'], sort_keys=True)
+        body = body if isinstance(body, (str, bytes)) else None
+        send_url = self.replay.proxy_url(url) if self.replay is not None else url
+        if self.cache is None:
+            return self._record(method, url, body, self._send(method, send_url, headers, kwargs, stage))
+
+        key = ResponseCache.key(method, url, body)
+        conditional_headers = self.cache.conditional_headers(key)
+        for k, v in conditional_headers.items():
+            headers.setdefault(k, v)
+
+        resp = self._send(method, send_url, headers, kwargs, stage)
+        if resp.status_code == 304 and conditional_headers:
+            return self._record(method, url, body, self.cache.cached_response(key, resp))
+        resp.from_cache = False
+        self.cache.store(key, resp)
+        return self._record(method, url, body, resp)
+
+    def get(self, url, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions = {}
+        if self.cache is not None:
+            self.cache.close()
+
+    def _record(self, method, url, body, resp):
+        if self.archive is not None and resp.status_code != 304:
+            self.archive.record(method, url, body, resp)
+        return resp
+
+    def _send(self, method, url, headers, kwargs, stage) -> requests.Response:
+        limiter = ratelimit.get_limiter(url)
+        for attempt in range(THROTTLE_RETRIES + 1):
+            limiter.acquire()
+            start = time.monotonic()
+            status = retry_after = None
+            size = 0
+            try:
+                resp = self.session(url).request(method, url, headers=headers, **kwargs)
+                status = resp.status_code
+                size = len(resp.content)
+                retry_after = ratelimit.parse_retry_after(resp.headers.get('Retry-After'))
+            finally:
+                latency = time.monotonic() - start
+                limiter.release(status, latency, retry_after)
+                telemetry.record_fetch(stage, status, size, latency)
+            if status not in ratelimit.THROTTLED_STATUSES:
+                break
+        return resp
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    def _generate_user_agents(self, size):
+        try:
+            from fake_useragent import UserAgent
+            ua = UserAgent()
+            return list({str(ua.chrome) for _ in range(size)})
+        except Exception as e:
+            print(f'Error: could not generate user agents ({e}), using fallback')
+            return [FALLBACK_USER_AGENT]
+
+
+_session_pool = None
+_session_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> SessionPool:
+    """ Returns the process-wide SessionPool shared by Doctor and the scrapers. """
+    global _session_pool
+    with _session_pool_lock:
+        if _session_pool is None:
+            _session_pool = SessionPool(cache=ResponseCache())
+        return _session_pool
+
+
+def configure(pool_size=POOL_SIZE, timeout=TIMEOUT, user_agent_pool_size=USER_AGENT_POOL_SIZE, cache=True,
+              archive=None, replay=None):
+    """ Replaces the shared SessionPool, e.g. to raise the pool size before a concurrent scrape.
+    `cache` is True for the default ResponseCache, a ResponseCache instance, or None to disable it.
+    `archive` records responses and `replay` serves them, see SessionPool. """
+    global _session_pool
+    if cache is True:
+        cache = ResponseCache()
+    with _session_pool_lock:
+        if _session_pool is not None:
+            _session_pool.close()
+        _session_pool = SessionPool(pool_size, timeout, user_agent_pool_size, cache or None, archive, replay)
+        return _session_pool
+
+
+def get(url, **kwargs) -> requests.Response:
+    return get_session_pool().get(url, **kwargs)
+
+
+def post(url, **kwargs) -> requests.Response:
+    return get_session_pool().post(url, **kwargs)
+
+
+def get_extracted(resp, fingerprint):
+    """ Returns fields cached for a response served from the cache, else None. """
+    cache = get_session_pool().cache
+    if cache is None or not getattr(resp, 'from_cache', False):
+        return None
+    return cache.get_extracted(resp.cache_key, fingerprint)
+
+
+def set_extracted(resp, fingerprint, fields: dict):
+    """ Remembers the fields extracted from a cached response's body. """
+    cache = get_session_pool().cache
+    if cache is not None and getattr(resp, 'cache_key', None) is not None:
+        cache.set_extracted(resp.cache_key, fingerprint, fields)
@@ -0,0 +1,196 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import pipeline.paths
+
+FSYNC_EVERY = 100  # records written between fsyncs
+REVISION = '_revision'
+REMOVED = '_removed'
+
+
+def raw_path(country, hospital_short_name):
+    """ Path of a hospital's append-only NDJSON raw file. """
+    return f'{pipeline.paths.DATA_PATH}/{country}/{country}_raw_{hospital_short_name}.jsonl'
+
+
+class NDJSONSink:
+    """ Appends doctor records to a raw file as newline-delimited JSON, one record
+    per line, fsyncing every `fsync_every` records so a crash loses at most that many.
+
+    With a `revision`, every line is tagged with it: when the file is read back, the
+    lines of the newest revision of a key (e.g. website) replace older ones, which
+    is how incremental runs upsert and remove doctors without rewriting the file.
+    """
+
+    def __init__(self, path, fsync_every=FSYNC_EVERY, revision=None):
+        self.path = path
+        self.fsync_every = fsync_every
+        self.revision = revision
+        self.count = 0
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, record: dict):
+        if self.revision is not None:
+            record = dict(record, **{REVISION: self.revision})
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+            self.count += 1
+            if self.count % self.fsync_every == 0:
+                self._sync()
+
+    def write_df(self, df: pd.DataFrame):
+        df = df.astype(object).where(pd.notnull(df), None)
+        for record in df.to_dict(orient='records'):
+            self.write(record)
+
+    def remove(self, key_value, key='website'):
+        """ Writes a tombstone hiding every earlier record with this key. """
+        self.write({key: key_value, REMOVED: True})
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _iter_lines(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_records(path, key='website'):
+    """ Lazily yields the live records of an NDJSON raw file.
+
+    A first pass keeps only the newest revision seen per key; the second pass yields
+    the records of that revision, skipping tombstones. Records without a revision
+    (full scrapes) or without a key are yielded as written.
+    """
+    if not os.path.isfile(path):
+        return
+    newest = {}
+    for record in _iter_lines(path):
+        if record.get(key) is not None:
+            revision = record.get(REVISION, 0)
+            newest[record[key]] = max(newest.get(record[key], 0), revision)
+
+    for record in _iter_lines(path):
+        revision = record.pop(REVISION, 0)
+        if record.get(key) is not None and revision != newest[record[key]]:
+            continue
+        if record.pop(REMOVED, False):
+            continue
+        yield record
+
+
+def read_raw_file(path, key='website') -> pd.DataFrame:
+    """ Reads a raw file, NDJSON or a legacy JSON array, into a DataFrame. """
+    if path.endswith('.jsonl'):
+        return pd.DataFrame(iter_records(path, key))
+    return pd.read_json(path, orient='records')
+
+
+def write_raw_file(path, df: pd.DataFrame):
+    """ Replaces a raw NDJSON file with df, through a temp file so a crash leaves the old one. """
+    tmp_path = f'{path}.tmp'
+    if os.path.isfile(tmp_path):
+        os.remove(tmp_path)
+    with NDJSONSink(tmp_path, fsync_every=len(df) + 1) as sink:
+        sink.write_df(df)
+    os.replace(tmp_path, path)
+
+
+def merge_raw_file(path, df: pd.DataFrame, revision, key='website'):
+    """ Upserts df into a raw NDJSON file: its rows are appended under revision and
+    replace the records with the same key. Rows without a key cannot be matched, so
+    they replace the file's keyless records instead, which needs a rewrite. """
+    keyless = df[key].isna() if key in df.columns else pd.Series(True, index=df.index)
+    if not keyless.any():
+        with NDJSONSink(path, revision=revision) as raw_sink:
+            raw_sink.write_df(df)
+        return
+    old = read_raw_file(path, key)
+    if key in old.columns and key in df.columns:
+        old = old[old[key].notna() & ~old[key].isin(df[key].dropna())]
+    elif key in old.columns:
+        old = old[old[key].notna()]
+    else:
+        old = old.iloc[0:0]
+    write_raw_file(path, pd.concat([old, df], ignore_index=True))
+
+
+def compact_raw_file(path, key='website'):
+    """ Rewrites a raw NDJSON file with only its live records. """
+    write_raw_file(path, read_raw_file(path, key))
+
+
+def migrate_raw_file(country, hospital_short_name):
+    """ Converts a legacy `<country>_raw_<hospital>.json` array into the NDJSON raw file. """
+    path = raw_path(country, hospital_short_name)
+    legacy_path = path[:-len('.jsonl')] + '.json'
+    if os.path.isfile(legacy_path) and not os.path.isfile(path):
+        write_raw_file(path, pd.read_json(legacy_path, orient='records'))
+        os.remove(legacy_path)
+    return path
+
+
+def scrape_to_raw_file(scraper_class, metadata: dict):
+    """ Runs a full scrape streaming into `<raw file>.partial`, which replaces the raw file
+    once the scrape finishes. Scrapers that do not stream return a DataFrame, which is
+    written the same way.
+
+    If a crashed scrape left a partial file, the scrape resumes it: its complete records
+    are kept and their websites are passed as metadata['resume'], which
+    AsyncDoctorFetcher skips without fetching (doctors of a returned DataFrame with those
+    websites are dropped).
+
+    A scrape that finds no doctor at all leaves the raw file as it was and raises
+    ValueError, so it is reported as failed instead of emptying the hospital.
+
+    Returns: number of doctors written
+    """
+    path = raw_path(metadata['country'], metadata['hospital_short_name'])
+    partial_path = f'{path}.partial'
+    resumed = _resume_partial(partial_path)
+    with NDJSONSink(partial_path) as raw_sink:
+        df = scraper_class(dict(metadata, sink=raw_sink, resume=resumed)).scrape()
+        if df is not None and not df.empty:
+            if resumed and 'website' in df.columns:
+                df = df[~df['website'].isin(resumed)]
+            raw_sink.write_df(df)
+        count = len(resumed) + raw_sink.count
+    if count == 0:
+        os.remove(partial_path)
+        raise ValueError(f'no doctors scraped for {metadata["hospital_short_name"]}, keeping its raw file')
+    os.replace(partial_path, path)
+    legacy_path = path[:-len('.jsonl')] + '.json'
+    if os.path.isfile(legacy_path):
+        os.remove(legacy_path)
+    return count
+
+
+def _resume_partial(partial_path) -> set:
+    """ Websites of the records of a partial file, after cutting the line a crash may
+    have left half written. """
+    if not os.path.isfile(partial_path):
+        return set()
+    with open(partial_path, 'rb+') as f:
+        content = f.read()
+        f.truncate(content.rfind(b'\n') + 1)
+    return {record.get('website') for record in _iter_lines(partial_path)} - {None}
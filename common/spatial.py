@@ -0,0 +1,219 @@
+""" Nearest-facility and radius queries over hospital locations and the doctors working there.
+
+Locations are indexed by a KD-tree over their positions on the unit sphere, so the
+straight-line (chord) distance between two points orders them exactly like the
+great-circle distance and queries need no scan of every location.
+
+Usage:
+    index = SpatialIndex.from_export()  # resources/locations.json
+    index.nearest(21.16, -86.85, n=3)  # [(location, km), ...]
+    doctors = DoctorIndex(pd.read_json(clean_export_path))
+    doctors.within(21.16, -86.85, km=10)  # doctors with a location within 10 km
+"""
+import heapq
+import json
+
+import numpy as np
+import pandas as pd
+
+LOCATIONS_PATH = 'pipeline/resources/locations.json'
+EARTH_RADIUS_KM = 6371.0088
+LEAF_SIZE = 8  # points per KD-tree leaf, scanned with numpy
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """ (n, 3) array of the points on the unit sphere. """
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0))
+
+
+def km_to_chord(km):
+    return 2 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+class KDTree:
+    """ Static KD-tree over 3-d points, splitting each node at the median of its widest axis. """
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 3)
+        self.leaf_size = leaf_size
+        self._order = np.arange(len(self.points))
+        self._nodes = []  # (start, end, axis, split, left, right), axis -1 for leaves
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, start, end):
+        node = len(self._nodes)
+        self._nodes.append(None)
+        if end - start <= self.leaf_size:
+            self._nodes[node] = (start, end, -1, 0.0, -1, -1)
+            return node
+        indexes = self._order[start:end]
+        points = self.points[indexes]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        self._order[start:end] = indexes[np.argsort(points[:, axis], kind='stable')]
+        middle = (start + end) // 2
+        split = self.points[self._order[middle], axis]
+        left = self._build(start, middle)
+        right = self._build(middle, end)
+        self._nodes[node] = (start, end, axis, split, left, right)
+        return node
+
+    def query(self, point, k=1):
+        """ Returns (distances, indexes) of the k points closest to point, closest first. """
+        point = np.asarray(point, dtype=float)
+        heap = []  # (-distance, index), the k best so far
+        if self._nodes:
+            self._query(0, point, k, heap)
+        best = sorted((-d, i) for d, i in heap)
+        return np.array([d for d, _ in best]), np.array([i for _, i in best], dtype=int)
+
+    def _query(self, node, point, k, heap):
+        start, end, axis, split, left, right = self._nodes[node]
+        if axis == -1:
+            indexes = self._order[start:end]
+            distances = np.linalg.norm(self.points[indexes] - point, axis=1)
+            for distance, index in zip(distances, indexes):
+                if len(heap) < k:
+                    heapq.heappush(heap, (-distance, int(index)))
+                elif distance < -heap[0][0]:
+                    heapq.heapreplace(heap, (-distance, int(index)))
+            return
+        diff = point[axis] - split
+        near, far = (left, right) if diff <= 0 else (right, left)
+        self._query(near, point, k, heap)
+        if len(heap) < k or abs(diff) < -heap[0][0]:
+            self._query(far, point, k, heap)
+
+    def query_radius(self, point, radius):
+        """ Returns (distances, indexes) of the points within radius of point, closest first. """
+        point = np.asarray(point, dtype=float)
+        found_distances, found_indexes = [], []
+        stack = [0] if self._nodes else []
+        while stack:
+            start, end, axis, split, left, right = self._nodes[stack.pop()]
+            if axis == -1:
+                indexes = self._order[start:end]
+                distances = np.linalg.norm(self.points[indexes] - point, axis=1)
+                inside = distances <= radius
+                found_distances.append(distances[inside])
+                found_indexes.append(indexes[inside])
+                continue
+            diff = point[axis] - split
+            if diff <= radius:
+                stack.append(left)
+            if diff >= -radius:
+                stack.append(right)
+        if not found_indexes:
+            return np.array([]), np.array([], dtype=int)
+        distances = np.concatenate(found_distances)
+        indexes = np.concatenate(found_indexes)
+        order = np.argsort(distances, kind='stable')
+        return distances[order], indexes[order]
+
+
+class SpatialIndex:
+    """ Locations (dicts with latitude and longitude, like locations.json entries)
+    searchable by distance. Locations without coordinates are left out. """
+
+    def __init__(self, locations):
+        self.locations = [location for location in locations if _has_coordinates(location)]
+        self.tree = KDTree(to_unit_vectors([location['latitude'] for location in self.locations],
+                                           [location['longitude'] for location in self.locations]))
+
+    @classmethod
+    def from_export(cls, path=LOCATIONS_PATH):
+        """ Builds the index from locations.json ({name: location}) or a locations csv. """
+        if path.endswith('.csv'):
+            return cls(pd.read_csv(path).to_dict(orient='records'))
+        with open(path, encoding='utf-8') as f:
+            locations = json.load(f)
+        return cls(locations.values() if isinstance(locations, dict) else locations)
+
+    def __len__(self):
+        return len(self.locations)
+
+    def nearest(self, latitude, longitude, n=1) -> list:
+        """ Returns [(location, km)] of the n locations closest to the point. """
+        return [(self.locations[i], km) for i, km in self.nearest_positions(latitude, longitude, n)]
+
+    def within(self, latitude, longitude, km) -> list:
+        """ Returns [(location, km)] of the locations at most km away, closest first. """
+        return [(self.locations[i], distance) for i, distance in self.within_positions(latitude, longitude, km)]
+
+    def nearest_positions(self, latitude, longitude, n=1) -> list:
+        """ Like nearest, with positions in self.locations instead of the locations. """
+        chords, indexes = self.tree.query(to_unit_vectors([latitude], [longitude])[0], n)
+        return [(int(i), float(km)) for i, km in zip(indexes, chord_to_km(chords))]
+
+    def within_positions(self, latitude, longitude, km) -> list:
+        chords, indexes = self.tree.query_radius(to_unit_vectors([latitude], [longitude])[0], km_to_chord(km))
+        return [(int(i), float(distance)) for i, distance in zip(indexes, chord_to_km(chords))]
+
+
+class DoctorIndex:
+    """ Doctors of a clean export found by the coordinates of their nested `location`
+    records. Each distinct location is indexed once, with the rows of the doctors
+    working there, so a query only touches the doctors of the locations it finds. """
+
+    def __init__(self, doctors: pd.DataFrame):
+        self.doctors = doctors.reset_index(drop=True)
+        keys = {}
+        locations = []
+        self._rows = []
+        for row, records in enumerate(self.doctors['location']):
+            for location in _location_records(records):
+                if not _has_coordinates(location):
+                    continue
+                key = (location.get('locationName'), location['latitude'], location['longitude'])
+                if key not in keys:
+                    keys[key] = len(locations)
+                    locations.append(location)
+                    self._rows.append([])
+                self._rows[keys[key]].append(row)
+        self.locations = SpatialIndex(locations)
+
+    def within(self, latitude, longitude, km) -> pd.DataFrame:
+        """ Doctors with a location at most km away, closest first, with a `distance`
+        column in km to their closest such location. """
+        distances = {}
+        for position, distance in self.locations.within_positions(latitude, longitude, km):
+            for row in self._rows[position]:
+                distances.setdefault(row, distance)
+        doctors = self.doctors.iloc[list(distances)].copy()
+        doctors['distance'] = list(distances.values())
+        return doctors
+
+    def nearest_locations(self, latitude, longitude, n=1) -> list:
+        """ Returns [(location, km, doctors DataFrame)] of the n closest locations. """
+        return [(self.locations.locations[position], distance, self.doctors.iloc[self._rows[position]])
+                for position, distance in self.locations.nearest_positions(latitude, longitude, n)]
+
+
+def _has_coordinates(location):
+    if not isinstance(location, dict):
+        return False
+    latitude, longitude = location.get('latitude'), location.get('longitude')
+    return latitude is not None and longitude is not None and not pd.isna(latitude) and not pd.isna(longitude)
+
+
+def _location_records(records):
+    """ A doctor's `location` as a list of dicts, whether stored as a list, a dict or JSON. """
+    if isinstance(records, str):
+        try:
+            records = json.loads(records)
+        except ValueError:
+            return []
+    if isinstance(records, dict):
+        return [records]
+    if isinstance(records, (list, tuple, np.ndarray)):
+        return [record for record in records if isinstance(record, dict)]
+    return []
@@ -0,0 +1,39 @@
+import os
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """ Base of the on-disk SQLite stores (ResponseCache, TranslationMemory, PlacesCache).
+
+    A store holds one connection, opened on first use, which creates the file's
+    directory and runs `schema` (a CREATE TABLE IF NOT EXISTS statement). The
+    connection is shared by threads, every use of it holding `_lock`.
+    """
+    schema = None
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(
+                self.path, timeout=30, check_same_thread=False)
+            self._conn.execute(self.schema)
+            self._conn.commit()
+            self._opened(self._conn)
+        return self._conn
+
+    def _opened(self, conn):
+        """ Called once the connection is open, for stores that read state from it. """
@@ -0,0 +1,91 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StandInServer:
+    """ Local threaded HTTP server standing in for a hospital website.
+
+    `pages` maps a request path (including the query string) to the response
+    body, so scrapers and benchmarks can run offline against known content.
+    `latency` adds a fixed delay per request to mimic a remote host.
+
+    Usage:
+        with StandInServer({'/doctor/1': html}) as server:
+            resp = requests.get(server.url('/doctor/1'))
+    """
+
+    def __init__(self, pages: dict = None, latency=0.0):
+        self.pages = pages or {}
+        self.latency = latency
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def url(self, path):
+        return self.base_url + path
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def respond(self, method, path, headers, body):
+        """ Returns (status, headers, body) for a request. Override for dynamic responses. """
+        if path not in self.pages:
+            return 404, {}, b'Not Found'
+        page = self.pages[path]
+        if isinstance(page, str):
+            page = page.encode('utf-8')
+        return 200, {'Content-Type': 'text/html; charset=utf-8'}, page
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._serve('GET')
+
+            def do_POST(self):
+                self._serve('POST')
+
+            def _serve(self, method):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                if server.latency:
+                    time.sleep(server.latency)
+                with server._lock:
+                    server.requests_served += 1
+                status, headers, content = server.respond(
+                    method, self.path, self.headers, body)
+                self.send_response(status)
+                for k, v in headers.items():
+                    self.send_header(k, v)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
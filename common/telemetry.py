@@ -0,0 +1,162 @@
+import json
+import math
+import os
+import threading
+import time
+
+PERCENTILES = (50, 95, 99)
+
+
+class HospitalTelemetry:
+    """ Collects the metrics of one hospital's scrape, per stage: requests sent, bytes
+    downloaded, status code counts and fetch/parse latencies.
+
+    Fetch latency is the time spent waiting on the network, parse latency the time spent
+    in lxml and the xpaths, so report() tells network-bound from parse-bound hospitals.
+    """
+
+    def __init__(self, hospital):
+        self.hospital = hospital
+        self.doctors = 0
+        self.stages = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def record_fetch(self, stage, status, size, seconds):
+        with self._lock:
+            metrics = self._stage(stage)
+            metrics['requests'] += 1
+            metrics['bytes'] += size
+            status = str(status) if status is not None else 'error'
+            metrics['status_codes'][status] = metrics['status_codes'].get(status, 0) + 1
+            metrics['fetch'].append(seconds)
+
+    def record_parse(self, stage, seconds):
+        with self._lock:
+            self._stage(stage)['parse'].append(seconds)
+
+    def report(self, doctors=None) -> dict:
+        """ Returns the metrics as a JSON-serializable dict, latencies in seconds. """
+        if doctors is not None:
+            self.doctors = doctors
+        seconds = time.perf_counter() - self._start
+        with self._lock:
+            stages = {
+                stage: {
+                    'requests': metrics['requests'],
+                    'bytes': metrics['bytes'],
+                    'status_codes': dict(metrics['status_codes']),
+                    'fetch_seconds': percentiles(metrics['fetch']),
+                    'parse_seconds': percentiles(metrics['parse']),
+                    'fetch_total_seconds': sum(metrics['fetch']),
+                    'parse_total_seconds': sum(metrics['parse']),
+                    'fetch_count': len(metrics['fetch']),
+                    'parse_count': len(metrics['parse']),
+                }
+                for stage, metrics in self.stages.items()
+            }
+        return {
+            'hospital': self.hospital,
+            'seconds': seconds,
+            'doctors': self.doctors,
+            'doctors_per_second': self.doctors / seconds if seconds else 0.0,
+            'requests': sum(s['requests'] for s in stages.values()),
+            'bytes': sum(s['bytes'] for s in stages.values()),
+            'stages': stages,
+        }
+
+    def _stage(self, stage):
+        if stage not in self.stages:
+            self.stages[stage] = {'requests': 0, 'bytes': 0, 'status_codes': {},
+                                  'fetch': [], 'parse': []}
+        return self.stages[stage]
+
+
+def percentiles(values) -> dict:
+    """ Nearest-rank p50/p95/p99 of values, None when there are none. """
+    values = sorted(values)
+    result = {}
+    for p in PERCENTILES:
+        result[f'p{p}'] = values[max(0, math.ceil(p / 100 * len(values)) - 1)] if values else None
+    return result
+
+
+# The hospital being scraped in this process: the orchestrator runs one hospital per
+# worker process at a time, so the pool threads of that scrape all report to it.
+_current = None
+
+
+def begin(hospital) -> HospitalTelemetry:
+    """ Starts collecting metrics for a hospital; requests and parses are recorded against it. """
+    global _current
+    _current = HospitalTelemetry(hospital)
+    return _current
+
+
+def end(doctors=None) -> dict:
+    """ Stops collecting and returns the current hospital's report, None if none was begun. """
+    global _current
+    telemetry, _current = _current, None
+    return telemetry.report(doctors) if telemetry is not None else None
+
+
+def record_fetch(stage, status, size, seconds):
+    telemetry = _current
+    if telemetry is not None:
+        telemetry.record_fetch(stage, status, size, seconds)
+
+
+def record_parse(stage, seconds):
+    telemetry = _current
+    if telemetry is not None:
+        telemetry.record_parse(stage, seconds)
+
+
+def save_report(reports, folder_path, prometheus=False):
+    """ Writes the reports of a run to `scrape_telemetry.json` in folder_path, next to the
+    exports, and to `scrape_telemetry.prom` in Prometheus text format if prometheus is set. """
+    if not os.path.isdir(folder_path):
+        os.makedirs(folder_path)
+    path = f'{folder_path}/scrape_telemetry'
+    with open(f'{path}.json', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'generated': time.time(), 'hospitals': reports}, indent=2))
+    if prometheus:
+        with open(f'{path}.prom', 'w', encoding='utf-8') as f:
+            f.write(to_prometheus(reports))
+    return f'{path}.json'
+
+
+def to_prometheus(reports) -> str:
+    """ Formats reports in the Prometheus text exposition format. """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        """ samples are (labels, value), or (labels, value, suffix) for the _sum and
+        _count series of a summary. """
+        lines.append(f'# HELP carpemed_scrape_{name} {help_text}')
+        lines.append(f'# TYPE carpemed_scrape_{name} {kind}')
+        for labels, value, *suffix in samples:
+            label_text = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f'carpemed_scrape_{name}{"".join(suffix)}{{{label_text}}} {value}')
+
+    by_stage = [({'hospital': r['hospital'], 'stage': stage}, s)
+                for r in reports for stage, s in r['stages'].items()]
+    metric('seconds', 'gauge', 'Wall clock time of the hospital scrape.',
+           [({'hospital': r['hospital']}, r['seconds']) for r in reports])
+    metric('doctors_per_second', 'gauge', 'Doctors extracted per second.',
+           [({'hospital': r['hospital']}, r['doctors_per_second']) for r in reports])
+    metric('requests_total', 'counter', 'Requests sent.',
+           [(labels, s['requests']) for labels, s in by_stage])
+    metric('bytes_total', 'counter', 'Bytes downloaded.',
+           [(labels, s['bytes']) for labels, s in by_stage])
+    metric('responses_total', 'counter', 'Responses by status code.',
+           [(dict(labels, code=code), count) for labels, s in by_stage
+            for code, count in s['status_codes'].items()])
+    for kind in ('fetch', 'parse'):
+        samples = []
+        for labels, s in by_stage:
+            samples += [(dict(labels, quantile=int(p[1:]) / 100), value)
+                        for p, value in s[f'{kind}_seconds'].items() if value is not None]
+            samples += [(labels, s[f'{kind}_total_seconds'], '_sum'), (labels, s[f'{kind}_count'], '_count')]
+        metric(f'{kind}_seconds', 'summary', f'{kind.capitalize()} latency quantiles.', samples)
+    return '\n'.join(lines) + '\n'
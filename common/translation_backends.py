@@ -0,0 +1,140 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+CHUNK_SIZE = 500  # texts per worksheet / batch
+WORKERS = 4  # chunks translated at once
+POLL_INTERVAL = 2.0  # seconds before the first re-fetch of unfinished cells
+MAX_POLL_INTERVAL = 30.0
+POLL_TIMEOUT = 15 * 60  # seconds a chunk may keep loading before it is given up on
+
+
+class TranslationBackend:
+    """ Translates batches of texts for Translator.
+
+    translate() splits texts into chunks of `chunk_size` and translates them on
+    `workers` threads; subclasses implement translate_chunk for one chunk and return
+    {text: translation}, leaving out texts they could not translate.
+    """
+
+    def __init__(self, chunk_size=CHUNK_SIZE, workers=WORKERS):
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    def translate(self, texts, source='auto', target='en') -> dict:
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        translations = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.translate_chunk, index, chunk, source, target)
+                       for index, chunk in enumerate(chunks)]
+            for future in futures:
+                try:
+                    translations.update(future.result())
+                except Exception as e:
+                    print(f'Error: translation chunk failed ({e})')
+        return translations
+
+    def translate_chunk(self, index, texts, source, target) -> dict:
+        raise NotImplementedError
+
+
+class DictionaryBackend(TranslationBackend):
+    """ Offline stand-in backend: translates from a dictionary and leaves out every other
+    text, which keeps its source text in the frame and is not stored in the translation
+    memory. `latency` is slept per chunk to mimic a remote service. """
+
+    def __init__(self, dictionary=None, latency=0.0, chunk_size=CHUNK_SIZE, workers=WORKERS):
+        super().__init__(chunk_size, workers)
+        self.dictionary = dictionary or {}
+        self.latency = latency
+        self.chunks = 0
+
+    def translate_chunk(self, index, texts, source, target) -> dict:
+        if self.latency:
+            time.sleep(self.latency)
+        self.chunks += 1
+        return {text: self.dictionary[text] for text in texts if text in self.dictionary}
+
+
+class SheetsBackend(TranslationBackend):
+    """ Translates with GOOGLETRANSLATE formulas in the 'translations' spreadsheet.
+
+    Each chunk gets its own worksheet (`<name>-<chunk>`), one formula per row. Polling
+    re-fetches only the rows still showing 'Loading...', waiting poll_interval seconds
+    at first and twice as long after every unfinished poll, up to max_poll_interval.
+    """
+
+    def __init__(self, name, spreadsheet='translations', chunk_size=CHUNK_SIZE, workers=WORKERS,
+                 poll_interval=POLL_INTERVAL, max_poll_interval=MAX_POLL_INTERVAL, timeout=POLL_TIMEOUT):
+        super().__init__(chunk_size, workers)
+        self.name = name
+        self.spreadsheet = spreadsheet
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @property
+    def gc(self):
+        """ Sheets client of the current worker thread, authorized (and pygsheets imported)
+        on first use: the underlying HTTP client must not be shared across threads. """
+        if getattr(self._local, 'gc', None) is None:
+            import pygsheets
+            self._local.gc = pygsheets.authorize(
+                service_file='pipeline/common/servicefile.json')
+        return self._local.gc
+
+    def translate_chunk(self, index, texts, source, target) -> dict:
+        sh = self.gc.open(self.spreadsheet)
+        wks = self._new_worksheet(sh, f'{self.name}-{index}')
+        wks.set_dataframe(pd.DataFrame({'translation': [
+            f'=GOOGLETRANSLATE("{_quote(text)}", "{source}", "{target}")' for text in texts]}), (1, 1))
+
+        results = [None] * len(texts)
+        pending = list(range(len(texts)))
+        interval = self.poll_interval
+        deadline = time.monotonic() + self.timeout
+        while True:
+            for start, end in _ranges(pending):
+                # Row 1 holds the header, text i is on row i + 2
+                values = wks.get_values((start + 2, 1), (end + 2, 1))
+                for i in range(start, end + 1):
+                    row = values[i - start] if i - start < len(values) else []
+                    results[i] = str(row[0]) if row else ''
+            pending = [i for i in pending if results[i].startswith('Loading')]
+            if not pending:
+                break
+            if time.monotonic() > deadline:
+                print(f'Error: {len(pending)} cells of {wks.title} still loading, giving up')
+                break
+            time.sleep(interval)
+            interval = min(interval * 2, self.max_poll_interval)
+        sh.del_worksheet(wks)
+
+        return {text: result for text, result in zip(texts, results)
+                if result and not result.startswith(('#', 'Loading'))}
+
+    def _new_worksheet(self, sh, title):
+        try:
+            return sh.add_worksheet(title)
+        except Exception:
+            print(f'Error: worksheet {title} already exists, replacing with new one...')
+            sh.del_worksheet(sh.worksheet_by_title(title))
+            return sh.add_worksheet(title)
+
+
+def _ranges(indexes):
+    """ Groups sorted indexes into (first, last) runs of consecutive indexes. """
+    ranges = []
+    for i in indexes:
+        if ranges and i == ranges[-1][1] + 1:
+            ranges[-1][1] = i
+        else:
+            ranges.append([i, i])
+    return [tuple(r) for r in ranges]
+
+
+def _quote(text):
+    return text.replace('"', '""')
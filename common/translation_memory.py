@@ -0,0 +1,49 @@
+import time
+
+from pipeline.common.sqlite_store import SQLiteStore
+
+MEMORY_PATH = 'pipeline/data/cache/translations.sqlite3'
+BATCH_SIZE = 500  # texts per SQL query, below SQLite's bound parameter limit
+
+
+class TranslationMemory(SQLiteStore):
+    """ On-disk store of translations already made, keyed by source text and language
+    pair, so each distinct string (a specialty, a degree, a hospital name) is sent to
+    the translation backend once instead of on every run of every hospital.
+    """
+    schema = ('CREATE TABLE IF NOT EXISTS translations ('
+              'source TEXT, target TEXT, text TEXT, translation TEXT, stored_at REAL, '
+              'PRIMARY KEY (source, target, text))')
+
+    def __init__(self, path=MEMORY_PATH):
+        super().__init__(path)
+
+    def lookup(self, texts, source='auto', target='en') -> dict:
+        """ Returns {text: translation} for the texts already in memory. """
+        texts = list(texts)
+        found = {}
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(texts), BATCH_SIZE):
+                batch = texts[i:i + BATCH_SIZE]
+                rows = conn.execute(
+                    'SELECT text, translation FROM translations WHERE source = ? AND target = ? '
+                    f'AND text IN ({",".join("?" * len(batch))})', [source, target] + batch)
+                found.update(rows)
+        return found
+
+    def store(self, translations: dict, source='auto', target='en'):
+        """ Remembers {text: translation} pairs. """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                'INSERT OR REPLACE INTO translations (source, target, text, translation, stored_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(source, target, text, translation, now) for text, translation in translations.items()])
+            conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute('SELECT COUNT(*) FROM translations').fetchone()[0]
+
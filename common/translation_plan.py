@@ -0,0 +1,101 @@
+import re
+
+import pandas as pd
+from pipeline.common import utils
+
+SCHEMA_PATH = 'pipeline/resources/schema.json'
+REMAPPER_PATH = 'pipeline/resources/providers_remapper.json'
+REASONS = ('never', 'enumeration', 'english', 'not_text')
+
+SPANISH_MARKS = re.compile(r'[áéíóúñü¿¡]', re.IGNORECASE)
+NOT_TEXT = re.compile(r'^\W*$|^[\d\W]+$|^(https?://|www\.)\S+$|^\S+@\S+\.\S+$', re.IGNORECASE)
+WORD = re.compile(r'[a-záéíóúñü]+')
+CAMEL = re.compile(r'[A-Z][a-z]+|[a-z]+')
+ENGLISH_STOPWORDS = {'the', 'and', 'of', 'in', 'with', 'for', 'to', 'is', 'at', 'on', 'from', 'by',
+                     'as', 'an', 'his', 'her', 'their', 'has', 'was', 'years'}
+SPANISH_STOPWORDS = {'de', 'del', 'la', 'el', 'los', 'las', 'y', 'en', 'con', 'por', 'para', 'que',
+                     'un', 'una', 'al', 'su', 'sus', 'es', 'se', 'como', 'años'}
+
+
+class TranslationPlan:
+    """ Decides which cells of a doctors DataFrame are worth sending to translation.
+
+    The "translation" section of schema.json gives each doctor field a kind:
+        never       - names, phones, urls... kept as scraped
+        enumeration - values the cleaners remap to canonical names (provider), translated
+                      only when a part is missing from providers_remapper.json
+        text        - free text, translated unless it already reads as English
+    Columns the schema does not list are treated as text. The cells left out are counted
+    by reason in `saved` after each call to masks().
+    """
+
+    def __init__(self, schema_path=SCHEMA_PATH, remapper_path=REMAPPER_PATH):
+        schema = utils.open_dictionary(schema_path)
+        remapper = utils.open_dictionary(remapper_path)
+        self.kinds = schema.get('translation', {})
+        self.providers = set(remapper)
+        # Canonical provider names are English, the raw remapper keys are not all
+        canonical = set(remapper.values()) | set(schema.get('providers', []))
+        self.vocabulary = {word.lower() for name in canonical if name for word in CAMEL.findall(name)}
+        self.saved = dict.fromkeys(REASONS, 0)
+
+    def kind(self, column):
+        return self.kinds.get(column, 'text')
+
+    def masks(self, df) -> dict:
+        """ Returns {column: mask of the cells to translate} for the columns with any. """
+        self.saved = dict.fromkeys(REASONS, 0)
+        masks = {}
+        for column in df.columns:
+            text = _text_mask(df[column])
+            if not text.any():
+                continue
+            kind = self.kind(column)
+            if kind == 'never':
+                self.saved['never'] += int(text.sum())
+                continue
+            # Each distinct value is judged once, then mapped back onto its cells
+            values = df.loc[text, column]
+            reasons = {value: self.skip_reason(value, kind) for value in pd.unique(values)}
+            skipped = values.map(reasons)
+            for reason, count in skipped.value_counts().items():
+                self.saved[reason] += int(count)
+            mask = text.copy()
+            mask[text] = skipped.isna().to_numpy()
+            if mask.any():
+                masks[column] = mask
+        return masks
+
+    def skip_reason(self, value, kind='text'):
+        """ Why `value` needs no translation ('enumeration', 'english', 'not_text'), or None. """
+        if kind == 'enumeration' and self.is_known_provider(value):
+            return 'enumeration'
+        if NOT_TEXT.match(value.strip()):
+            return 'not_text'
+        if self.is_english(value):
+            return 'english'
+        return None
+
+    def is_known_provider(self, value):
+        """ True when every part of the value is a key of the providers remapper, normalized
+        the way the cleaners look them up. """
+        parts = [part.strip().replace(' ', '') for part in re.split(r'[|,]', value.title())]
+        parts = [part for part in parts if part not in ('', 'And')]
+        return bool(parts) and all(part in self.providers for part in parts)
+
+    def is_english(self, value):
+        """ No Spanish letters and more English than Spanish stopwords, or, without
+        stopwords, only words of canonical provider names. """
+        if SPANISH_MARKS.search(value):
+            return False
+        words = WORD.findall(value.lower())
+        english = sum(word in ENGLISH_STOPWORDS for word in words)
+        spanish = sum(word in SPANISH_STOPWORDS for word in words)
+        if english or spanish:
+            return english > spanish
+        return bool(words) and all(word in self.vocabulary for word in words)
+
+
+def _text_mask(column: pd.Series) -> pd.Series:
+    """ True for the non-empty string cells of a column. """
+    return column.map(lambda x: isinstance(x, str) and x != '').astype(bool)
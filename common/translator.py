@@ -1,69 +1,89 @@
-import gspread
-import ast
-import pandas as pd
-import pygsheets
 import numpy as np
-import time
+import pandas as pd
+from pipeline.common.translation_backends import SheetsBackend
+from pipeline.common.translation_memory import TranslationMemory
+from pipeline.common.translation_plan import TranslationPlan
 
 
 class Translator:
-    """ A class that translate tabular data. """
+    """ A class that translate tabular data.
 
-    def __init__(self, df, name):
+    A TranslationPlan first leaves out the cells not worth translating (names, phones,
+    known providers, text already in English). Each distinct remaining string is
+    translated once: strings already in the
+    TranslationMemory are reused, only the missing ones are sent to the translation
+    backend (Google Sheets unless configured otherwise), and the translations are
+    stored and then mapped back onto every column.
+    """
+
+    def __init__(self, df, name, memory=None, source='auto', target='en', backend=None, plan=None):
         self.name = name
         self.df = df
-        self.gc = pygsheets.authorize(
-            service_file='pipeline/common/servicefile.json')
-        self.wks = None
-
-    def add_df_as_worksheet(self):
-        # Apply translation function to df items
-        df = self.df.applymap(
-            lambda x: x.replace('"', '') if (
-                type(x) != bool and x != '' and type(x) != float and x != None) else x
-        )
-        df = df.applymap(
-            lambda x: f'=GOOGLETRANSLATE("{x}")' if (
-                type(x) != bool and x != '') else x
-        )
-        df = df.where(pd.notnull(df), None)
-        df = df.replace({np.nan: None})
-        # open the google spreadsheet (where 'translations' is the name of my sheet)
-        sh = self.gc.open('translations')
-        try:
-            self.wks = sh.add_worksheet(self.name)
-            self.wks.set_dataframe(df, (1, 1))
-        except Exception as e:
-            print('Error: worksheet already exists, replacing with new one...')
-            wk = sh.worksheet_by_title(self.name)
-            sh.del_worksheet(wk)
-            self.wks = sh.add_worksheet(self.name)
-            self.wks.set_dataframe(df, (1, 1))
-
-    def still_loading(self, df):
-        still_loading = False
-        for column in df.columns:
-            loading = df[column].astype(str).str.contains('Loading...').any()
-            if loading:
-                still_loading = True
-                break
-        return still_loading
+        self.memory = memory if memory is not None else _default_memory()
+        self.source = source
+        self.target = target
+        self.backend = backend if backend is not None else _default_backend(name)
+        self.plan = plan if plan is not None else TranslationPlan()
+        self.stats = {}
 
     def translate(self):
         """
-        Uploads sheet to gsheets, translates, returns dataframe.
+        Translates the strings missing from the translation memory, returns dataframe.
         """
-        self.add_df_as_worksheet()
-        df = self.wks.get_as_df()
-        while self.still_loading(df):
-            print('Still translating')
-            time.sleep(10)
-            df = self.wks.get_as_df()
-        try:
-            df['confirmedHours'] = df['confirmedHours'].apply(
-                lambda x: ast.literal_eval(x.title()))
-        except Exception as e:
-            print(f'Error: missing column {e}')
+        masks = self.plan.masks(self.df)
+        cells = [self.df.loc[mask, column].to_numpy() for column, mask in masks.items()]
+        texts = list(pd.unique(np.concatenate(cells))) if cells else []
+
+        translations = self.memory.lookup(texts, self.source, self.target)
+        missing = [text for text in texts if text not in translations]
+        if missing:
+            translated = self.translate_texts(missing)
+            self.memory.store(translated, self.source, self.target)
+            translations.update(translated)
+
+        self.stats = {'cells': int(sum(len(c) for c in cells)), 'distinct': len(texts),
+                      'from_memory': len(texts) - len(missing), 'sent': len(missing),
+                      'saved': sum(self.plan.saved.values())}
+        skipped = ', '.join(f'{reason}: {count}' for reason, count in self.plan.saved.items() if count)
+        print(f'{self.name}: {self.stats["cells"]} cells, {self.stats["distinct"]} distinct, '
+              f'{self.stats["from_memory"]} from translation memory, {self.stats["sent"]} sent, '
+              f'{self.stats["saved"]} cells skipped' + (f' ({skipped})' if skipped else ''))
+
+        df = self.df.copy()
+        for column, mask in masks.items():
+            translated = df[column].map(translations)
+            found = mask & translated.notna()
+            if found.any():
+                df[column] = translated.where(found, df[column])
         df = df.replace('', np.nan)
         df = df.replace('None', np.nan)
         return df
+
+    def translate_texts(self, texts) -> dict:
+        """ Returns {text: translation} from the backend, leaving out texts it could not translate. """
+        return self.backend.translate(texts, self.source, self.target)
+
+
+_backend_factory = None
+_memory = None
+
+
+def configure(backend_factory=None, memory=None):
+    """ Sets the backend and memory every Translator uses unless given its own.
+    backend_factory is a callable taking the worksheet name, e.g. `lambda name:
+    DictionaryBackend()` with a throwaway TranslationMemory to run the pipeline offline.
+    None restores the Google Sheets backend and the default memory. """
+    global _backend_factory, _memory
+    _backend_factory = backend_factory
+    _memory = memory
+
+
+def _default_backend(name):
+    if _backend_factory is not None:
+        return _backend_factory(name)
+    return SheetsBackend(name)
+
+
+def _default_memory():
+    return _memory if _memory is not None else TranslationMemory()
+
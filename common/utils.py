@@ -46,9 +46,15 @@ def update_index(update_type, country_name, hospital_name=None, debug_mode=False
         index[country_name][update_type] = date
     save_dictionary(index, index_path)
 
-def save_export(file_name, df): 
+def export_folder():
+    """ Returns today's exports folder, 'pipeline/data/exports/MMDDYY' """
     date_string = date.today().strftime("%m%d%y")
-    folder_path = f'pipeline/data/exports/{date_string}'
+    return f'pipeline/data/exports/{date_string}'
+
+
+def save_export(file_name, df): 
+    folder_path = export_folder()
+    date_string = folder_path[-6:]
 
     if not os.path.isdir(folder_path):
         os.mkdir(folder_path)
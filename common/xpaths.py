@@ -0,0 +1,110 @@
+import bisect
+import json
+import threading
+
+from lxml import etree
+
+_local = threading.local()
+
+
+class XPathPlan:
+    """ A hospital's `xpaths` metadata compiled once into lxml.etree.XPath objects.
+
+    `prefix` is prepended to every xpath, e.g. '.' to evaluate them relative to a
+    doctor cell instead of the whole page. Evaluation uses smart_strings=False, so
+    results are plain strings without a back reference to the tree.
+    """
+
+    def __init__(self, xpaths: dict, prefix=''):
+        self.xpaths = xpaths
+        self.compiled = {}
+        for column, xpath in xpaths.items():
+            try:
+                self.compiled[column] = etree.XPath(
+                    prefix + xpath, smart_strings=False)
+            except etree.XPathSyntaxError as e:
+                print(f'Error: invalid xpath for {column}: {e}')
+                self.compiled[column] = None
+
+    def extract(self, tree) -> dict:
+        """ Evaluates every column against the same parsed tree or element.
+        Returns items delimited by '|', or None where an xpath fails. """
+        fields = {}
+        for column, xpath in self.compiled.items():
+            try:
+                fields[column] = '|'.join(xpath(tree))
+            except Exception:
+                fields[column] = None
+        return fields
+
+    def evaluate(self, tree) -> dict:
+        """ Like extract, but keeps each column's raw list of results. """
+        return {column: xpath(tree) if xpath is not None else []
+                for column, xpath in self.compiled.items()}
+
+
+class GroupedPlan:
+    """ One-pass extraction for list pages holding many doctors (MedicaSur, Amerimed).
+
+    `group` selects the card of each doctor. Each column xpath is evaluated once over
+    the whole page and every result goes to the card it lies in, instead of re-running
+    the xpaths over the whole page once per doctor; results outside every card are
+    dropped. Evaluation uses smart strings, to find the node each text or attribute
+    came from.
+    """
+
+    def __init__(self, group, xpaths: dict):
+        self.group = etree.XPath(group)
+        self.xpaths = xpaths
+        self.compiled = {}
+        for column, xpath in xpaths.items():
+            try:
+                self.compiled[column] = etree.XPath(xpath)
+            except etree.XPathSyntaxError as e:
+                print(f'Error: invalid xpath for {column}: {e}')
+                self.compiled[column] = None
+
+    def extract(self, tree) -> list:
+        """ Returns one dict per card with every column's values, whitespace
+        collapsed and delimited by '|'. """
+        position = {node: i for i, node in enumerate(tree.getroottree().iter())}
+        cards = self.group(tree)
+        starts = [position[node] for node in cards]
+        ends = [position[node] + sum(1 for _ in node.iterdescendants()) for node in cards]
+        groups = [{column: [] for column in self.compiled} for _ in cards]
+        for column, xpath in self.compiled.items():
+            try:
+                results = xpath(tree) if xpath is not None else []
+            except Exception:
+                results = []
+            for result in results:
+                if isinstance(result, etree._Element):
+                    node, result = result, result.xpath('string()')
+                else:
+                    node = result.getparent()
+                at = position.get(node, -1)
+                index = bisect.bisect_right(starts, at) - 1
+                if index >= 0 and at <= ends[index]:
+                    groups[index][column].append(' '.join(str(result).split()))
+        return [{column: '|'.join(values) for column, values in group.items()} for group in groups]
+
+
+def get_plan(xpaths: dict, prefix='') -> XPathPlan:
+    """ Returns the compiled plan for xpaths, compiling it on first use.
+    Plans are kept per thread, since compiled XPath objects must not be shared across threads. """
+    if not hasattr(_local, 'plans'):
+        _local.plans = {}
+    key = (json.dumps(xpaths, sort_keys=True), prefix)
+    if key not in _local.plans:
+        _local.plans[key] = XPathPlan(xpaths, prefix)
+    return _local.plans[key]
+
+
+def get_grouped_plan(group, xpaths: dict) -> GroupedPlan:
+    """ Returns the compiled GroupedPlan for a group xpath and xpaths, kept per thread like get_plan. """
+    if not hasattr(_local, 'plans'):
+        _local.plans = {}
+    key = (json.dumps(xpaths, sort_keys=True), f'group:{group}')
+    if key not in _local.plans:
+        _local.plans[key] = GroupedPlan(group, xpaths)
+    return _local.plans[key]
@@ -1,69 +1,138 @@
+import hashlib
+import json
+import time
+
 import lxml.html
-import requests
-from fake_useragent import UserAgent
+import pandas as pd
+from pipeline.common import sessions, telemetry
+from pipeline.common.xpaths import get_plan
+
+
+DOCTOR_FIELDS = (
+    'doctorId',  # TODO: generate random uuid4
+    'name', 'provider', 'phoneNumber', 'location', 'description', 'spokenLanguages',
+    'website', 'email', 'hoursOperation', 'hoursOperationObj', 'confirmedHours',
+    'ratings', 'rating', 'education', 'additionalInformation', 'teleHealth', 'city',
+    'country', 'photoUrl', 'otherActivities', 'alternativeMedicine',
+)
+
+
+class DoctorRecord:
+    """ One scraped doctor, with a slot per DOCTOR_FIELDS column instead of a 22-key dict.
+
+    Supports item access (record['name']) so it can be filled like the dicts it replaces.
+    Build DataFrames from many records with DoctorBatch rather than record by record.
+    """
+    __slots__ = DOCTOR_FIELDS
+
+    def __init__(self, **fields):
+        for field in DOCTOR_FIELDS:
+            setattr(self, field, None)
+        self.confirmedHours = False
+        self.update(fields)
+
+    @classmethod
+    def for_hospital(cls, metadata: dict):
+        """ Record with the hospital's location, country and city filled in. """
+        return cls(location=metadata['hospital_name'], country=metadata['country'],
+                   city=metadata.get('city'))
+
+    def update(self, fields: dict):
+        for field, value in fields.items():
+            setattr(self, field, value)
+
+    def to_dict(self) -> dict:
+        return {field: getattr(self, field) for field in DOCTOR_FIELDS}
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except AttributeError:
+            raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        setattr(self, field, value)
+
+    def __eq__(self, other):
+        return isinstance(other, DoctorRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f'DoctorRecord(name={self.name!r}, website={self.website!r})'
+
+
+class DoctorBatch:
+    """ Columnar builder: appends records straight into one list per column, so
+    to_frame() hands pandas the columns without converting each row to a dict. """
+
+    def __init__(self, records=()):
+        self.columns = {field: [] for field in DOCTOR_FIELDS}
+        self.extend(records)
+
+    def append(self, record: DoctorRecord):
+        for field, column in self.columns.items():
+            column.append(getattr(record, field))
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def to_frame(self, fields=DOCTOR_FIELDS) -> pd.DataFrame:
+        """ DataFrame of the batch, with the given columns, e.g. schema.json doctor_fields. """
+        return pd.DataFrame({field: self.columns[field] for field in fields})
+
+    def __len__(self):
+        return len(self.columns['name'])
 
 
 class Doctor:
-    def __init__(self, metadata, strategy, *argv):
+    def __init__(self, metadata, strategy, *argv, previous_fingerprint=None):
         self.metadata = metadata
         self.strategy = strategy
         self.argv = ''.join(argv)
+        self.previous_fingerprint = previous_fingerprint
+        self.fingerprint = None
+        self.unchanged = False
+        self.doctor_information = DoctorRecord.for_hospital(metadata)
 
-        self.doctor_information = {
-            'doctorId': None,  # TODO: generate random uuid4
-            'name': None,
-            'provider': None,
-            'phoneNumber': None,
-            'location': metadata['hospital_name'],
-            'description': None,
-            'spokenLanguages': None,
-            'website': None,
-            'email': None,
-            'hoursOperation': None,
-            'hoursOperationObj': None,
-            'confirmedHours': False,
-            'ratings': None,
-            'rating': None,
-            'education': None,
-            'additionalInformation': None,
-            'teleHealth': None,
-            'city': None,
-            'country': metadata['country'],
-            'photoUrl': None,
-            'otherActivities': None,
-            'alternativeMedicine': None
-        }
-
-    def extract_doctor_information(self):
+    def extract(self) -> DoctorRecord:
+        """ Extracts the doctor with the strategy and returns its DoctorRecord. """
         if self.strategy == 'static':
-            return self._static_page_extract_doctor_information(self.metadata, self.argv)
-        else:
-            return self.doctor_information
+            self._static_page_extract_doctor_information(self.metadata, self.argv)
+        return self.doctor_information
+
+    def extract_doctor_information(self) -> dict:
+        return self.extract().to_dict()
 
     def _static_page_extract_doctor_information(self, metadata, doctor_url):
-        """ Calls get_xpath for each field and creates a DataFrame row for doctor/provider scraped. """
+        """ Calls get_xpath for each field and creates a DataFrame row for doctor/provider scraped.
+        If the page content matches previous_fingerprint, nothing is extracted and unchanged is set. """
 
         self._set_doctor_information('website', doctor_url)
         self._set_doctor_information('city', self.metadata['city'])
-        ua = UserAgent()
-        headers = {'User-Agent': str(ua.chrome)}
-        resp = requests.get(self.argv, headers=headers)
-        tree = lxml.html.fromstring(resp.content)
-  
-        for column, xpath in metadata['xpaths'].items():
-            self.doctor_information[column] = self._get_xpath(tree, xpath)
+        resp = sessions.get(self.argv, stage='doctor')
+        self.fingerprint = hashlib.sha1(resp.content).hexdigest()
+        if self.fingerprint == self.previous_fingerprint:
+            self.unchanged = True
+            return self.doctor_information
+
+        fingerprint = self._xpaths_fingerprint(metadata['xpaths'])
+        fields = sessions.get_extracted(resp, fingerprint)
+        if fields is None:
+            start = time.perf_counter()
+            tree = lxml.html.fromstring(resp.content)
+            fields = get_plan(metadata['xpaths']).extract(tree)
+            telemetry.record_parse('doctor', time.perf_counter() - start)
+            sessions.set_extracted(resp, fingerprint, fields)
 
+        self.doctor_information.update(fields)
         return self.doctor_information
 
+    def _xpaths_fingerprint(self, xpaths):
+        """ Identifies the xpaths used, so cached fields are re-extracted when they change. """
+        return hashlib.sha1(json.dumps(xpaths, sort_keys=True).encode('utf-8')).hexdigest()
+
     def _set_doctor_information(self, field, value):
         try:
             self.doctor_information[field] = value
         except Exception as e:
             print(e)
-
-    def _get_xpath(self, tree, path):
-        """ Tries to find field information provided xpath. Returns items delimited by '|'. """
-        try:
-            return '|'.join(tree.xpath(path))
-        except:
-            return None
@@ -0,0 +1,3 @@
+DATA_PATH = 'pipeline/data'
+INDEX_PATH = f'{DATA_PATH}/index.json'
+FINGERPRINTS_PATH = f'{DATA_PATH}/fingerprints'
@@ -1,10 +1,12 @@
+import asyncio
+
 import lxml.html
-import pandas as pd
-import requests
 import tqdm
-from fake_useragent import UserAgent
+from pipeline.common import sessions
+from pipeline.common.crawler import DEFAULT_CONCURRENCY, Frontier, iter_fetched
 from pipeline.common.translator import Translator
-from pipeline.models.doctor import Doctor
+from pipeline.common.xpaths import get_plan
+from pipeline.models.doctor import DoctorBatch, DoctorRecord
 
 
 class ClinicaUnionMedicaDelNorte():
@@ -19,29 +21,43 @@ class ClinicaUnionMedicaDelNorte():
         Returns: DataFrame
         """
         url = 'https://clinicaunionmedica.com/medicos/'
-        ua = UserAgent()
-        headers = {'User-Agent': str(ua.chrome)}
-        resp = requests.get(url, headers=headers)
+        resp = sessions.get(url)
         tree = lxml.html.fromstring(resp.content)
         specialty_urls = [url for url in tree.xpath(
             "//div[contains(@class, 'feature-btn')]/a/@href")]
 
-        information = []
-        for url in tqdm.tqdm(specialty_urls, 'Scraping doctors'):
-            resp = requests.get(url, headers=headers)
-            specialtyTree = lxml.html.fromstring(resp.content)
-            doctorCells = specialtyTree.xpath("//div[contains(@class, 'em-team')]")
-            for cell in doctorCells:
-                doctor = Doctor(self.metadata, 'class_methods_not_in_use')
-                doctor_information = doctor.doctor_information
-                doctor_information['city'] = self.metadata['city']
-                for column, xpath in self.metadata["xpaths"].items():
-                    doctor_information[column] = "|".join(cell.xpath("." + xpath))
-                information.append(doctor_information)
-        df = pd.DataFrame(information)
+        pages = asyncio.run(self._fetch_specialty_pages(specialty_urls))
+
+        # Keep specialty order and list a doctor found under several specialties once
+        batch = DoctorBatch()
+        frontier = Frontier()
+        for _, doctors in sorted(pages, key=lambda x: x[0]):
+            for record in doctors:
+                if frontier.add((record.name, record.photoUrl)):
+                    batch.append(record)
+        df = batch.to_frame()
         translator = Translator(df, self.metadata['hospital_short_name'])
         df = translator.translate()
         return df
 
+    async def _fetch_specialty_pages(self, specialty_urls):
+        """ Fetches and parses specialty pages concurrently, returning (index, doctors) per page. """
+        concurrency = int(self.metadata.get('concurrency', DEFAULT_CONCURRENCY))
+        pages = []
+        with tqdm.tqdm(total=len(specialty_urls), desc='Scraping doctors') as progress:
+            async for index, _, doctors in iter_fetched(specialty_urls, self._doctors_in_specialty, concurrency):
+                pages.append((index, doctors))
+                progress.update()
+        return pages
 
-
+    def _doctors_in_specialty(self, resp):
+        cell_plan = get_plan(self.metadata["xpaths"], prefix=".")
+        specialtyTree = lxml.html.fromstring(resp.content)
+        doctorCells = specialtyTree.xpath("//div[contains(@class, 'em-team')]")
+        doctors = []
+        for cell in doctorCells:
+            record = DoctorRecord.for_hospital(self.metadata)
+            record.update(
+                {column: "|".join(values) for column, values in cell_plan.evaluate(cell).items()})
+            doctors.append(record)
+        return doctors
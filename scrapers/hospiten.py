@@ -1,13 +1,19 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import numpy as np
 import pandas as pd
 import requests
 import tqdm
 import pipeline.common.utils
-from bs4 import BeautifulSoup
+from pipeline.common import ratelimit, sessions
 from pipeline.common.translator import Translator
 
+DEFAULT_CONCURRENCY = 8
+MAX_RETRIES = 2  # for connection errors and 5xx; sessions already resends a 429/503
+BACKOFF_FACTOR = 0.5  # seconds, doubled after every failed attempt
+
 
 class Hospiten:
     def __init__(self, metadata: dict):
@@ -17,6 +23,9 @@ class Hospiten:
         self.page_size = metadata['page_size']
         self.tab_id = metadata['tab_id']
         self.center_list = metadata['center_list']
+        self.concurrency = int(metadata.get('concurrency', DEFAULT_CONCURRENCY))
+        self.max_retries = int(metadata.get('max_retries', MAX_RETRIES))
+        self.failed_ids = []
         self.headers = {
             'TabId': self.tab_id,
             'Content-Type': 'application/json; charset=UTF-8',
@@ -24,24 +33,32 @@ class Hospiten:
         }
 
     def scrape(self):
-        url = 'https://hospiten.com/en/API/Hospiten/Professional/GetProfessional'
-        doctor_jsons = []
-        doctor_ids = self._get_doctor_ids()
-        for doctor_id in tqdm.tqdm(doctor_ids, f'Scraping {self.metadata["hospital_name"]} doctors'):
-            payload = {
-                "ModuleId": int(self.module_id),
-                "ProfessionalId": doctor_id,
-                "Culture": "en-US",
-                "UserLocation": None
-            }
-            resp = requests.post(url, headers=self.headers,
-                                 data=json.dumps(payload))
-            try:
-                doctor_json = resp.json()
-                doctor_jsons.append(doctor_json)
-            except Exception as e:
-                print(e)
-        df = pd.json_normalize(i['Professional'] for i in doctor_jsons)
+        """ Fetches every professional of the hospital in parallel while the id
+        listing is still being paged through, then formats them as doctors.
+
+        Returns: DataFrame
+        """
+        doctor_ids = []
+        doctor_jsons = {}
+        self.failed_ids = []
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {}
+            for doctor_id in self._iter_doctor_ids():
+                doctor_ids.append(doctor_id)
+                futures[executor.submit(self._get_professional, doctor_id)] = doctor_id
+            for future in tqdm.tqdm(as_completed(futures), f'Scraping {self.metadata["hospital_name"]} doctors', total=len(futures)):
+                doctor_id = futures[future]
+                doctor_json = future.result()
+                if doctor_json is None:
+                    self.failed_ids.append(doctor_id)
+                else:
+                    doctor_jsons[doctor_id] = doctor_json
+
+        if self.failed_ids:
+            print(f'Error: {len(self.failed_ids)} of {len(doctor_ids)} {self.metadata["hospital_name"]} '
+                  f'doctors failed after {self.max_retries} retries: {self.failed_ids}')
+
+        df = pd.json_normalize(doctor_jsons[i]['Professional'] for i in doctor_ids if i in doctor_jsons)
         df = self._format_hospiten(df)
 
         if self.metadata['language'] != 'en':
@@ -50,26 +67,66 @@ class Hospiten:
 
         return df
 
-    def _get_doctor_ids(self):
-        """ POST request to get doctor ids from module_id (hospital). """
-        url = 'https://hospiten.com/en/API/Hospiten/Professional/GetProfessionals'
-        data = {
+    def _get_professional(self, doctor_id):
+        """ POST request for one professional. A connection error or a 5xx is retried
+        with exponential backoff; a 429/503 has already been resent by sessions once the
+        host backed off, and other errors would fail again, so neither is retried.
+        Returns the response json, or None if the request failed. """
+        url = 'https://hospiten.com/en/API/Hospiten/Professional/GetProfessional'
+        payload = {
             "ModuleId": int(self.module_id),
+            "ProfessionalId": doctor_id,
             "Culture": "en-US",
-            "PageSize": int(self.page_size),
-            "CurrentPage": 1,
-            "SortColumn": "",
-            "SortOrder": "ASC",
-            "CountryList": [],
-            "CenterList": [{"Id": int(self.center_list)}],
-            "SpecialtyList": []
+            "UserLocation": None
         }
-        resp = requests.post(
-            url, headers=self.headers, data=json.dumps(data))
-        self.status_code = resp.status_code
-        doctor_ids = [i['ProfessionalId']
-                      for i in resp.json()['Professionals']]
-        return doctor_ids
+        for attempt in range(self.max_retries + 1):
+            try:
+                resp = sessions.post(url, headers=self.headers,
+                                     data=json.dumps(payload), stage='doctor')
+                if resp.status_code < 500 or resp.status_code in ratelimit.THROTTLED_STATUSES:
+                    resp.raise_for_status()
+                    return resp.json()
+                error = f'{resp.status_code} response'
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except (requests.RequestException, ValueError) as e:
+                print(f'Error: professional {doctor_id}: {e}')
+                return None
+            if attempt == self.max_retries:
+                print(f'Error: professional {doctor_id}: {error}')
+                return None
+            time.sleep(BACKOFF_FACTOR * 2 ** attempt)
+
+    def _iter_doctor_ids(self):
+        """ POST requests to get doctor ids from module_id (hospital), yielded page by page
+        using CurrentPage until a short or already seen page comes back. """
+        url = 'https://hospiten.com/en/API/Hospiten/Professional/GetProfessionals'
+        seen = set()
+        current_page = 1
+        while True:
+            data = {
+                "ModuleId": int(self.module_id),
+                "Culture": "en-US",
+                "PageSize": int(self.page_size),
+                "CurrentPage": current_page,
+                "SortColumn": "",
+                "SortOrder": "ASC",
+                "CountryList": [],
+                "CenterList": [{"Id": int(self.center_list)}],
+                "SpecialtyList": []
+            }
+            resp = sessions.post(
+                url, headers=self.headers, data=json.dumps(data))
+            self.status_code = resp.status_code
+            page_ids = [i['ProfessionalId']
+                        for i in resp.json()['Professionals']]
+            new_ids = [i for i in page_ids if i not in seen]
+            for doctor_id in new_ids:
+                seen.add(doctor_id)
+                yield doctor_id
+            if len(page_ids) < int(self.page_size) or not new_ids:
+                return
+            current_page += 1
 
     def _format_hospiten(self, df):
         """ Format json data from hospiten POST request. """
@@ -82,6 +139,8 @@ class Hospiten:
         df['provider'] = df['provider'].apply(
             lambda x: x[0]['Name'] if len(x) > 0 else None)
 
+        from bs4 import BeautifulSoup
+
         def clean_html(x): return BeautifulSoup(x, features='lxml').get_text()
         df['education'] = (
             df['education'].apply(clean_html)
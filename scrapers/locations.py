@@ -1,16 +1,44 @@
 from os import environ
 import re
+import threading
 import tqdm
-import requests
 import json
-import uuid
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from pipeline.common.places_cache import PlacesCache
+from pipeline.common.registry import UUIDS_PATH, IdRegistry
 from pipeline.common.utils import open_dictionary, save_dictionary, save_export
-from pipeline.common import utils
+from pipeline.common import ratelimit, sessions
+
+GMAPS_HOST = 'maps.googleapis.com'
+GMAPS_URL = f'https://{GMAPS_HOST}'
+GMAPS_RATE_LIMIT = {'rate': 10, 'burst': 10, 'max_concurrency': 8}
+DETAILS_FIELDS = 'international_phone_number,website,opening_hours'
+CACHED_STATUSES = ('OK', 'ZERO_RESULTS')  # errors such as OVER_QUERY_LIMIT are asked again
 
 class Locations:
-    def __init__(self, path):
+    """ Collects hospital locations from the Google Maps geocoding and place details APIs.
+
+    Hospitals are looked up `workers` at a time, within the maps.googleapis.com rate
+    limits, and results are reused from a PlacesCache until they expire. Location ids
+    come from an IdRegistry flushed to uuids.json once per run. `base_url`
+    points the API calls elsewhere, e.g. at a local stand-in server in tests.
+    """
+
+    def __init__(self, path, cache=True, base_url=GMAPS_URL, workers=GMAPS_RATE_LIMIT['max_concurrency'],
+                 uuids_path=UUIDS_PATH):
         self.path = path
+        # True for the default PlacesCache, a PlacesCache instance, or None to disable it
+        self.cache = PlacesCache() if cache is True else cache
+        self.base_url = base_url
+        self.workers = workers
+        self.uuids_path = uuids_path
+        self.registry = None
+        self.cache_hits = 0
+        self.requests = 0
+        self.country_isos = open_dictionary('pipeline/resources/schema.json')['country_isos']
+        self._lock = threading.Lock()
+        ratelimit.configure_host(GMAPS_HOST, **GMAPS_RATE_LIMIT)
 
     def aggregate_locations(self):
         """ This function will read the locations from locations metadata (path) and save the data to locations.json """
@@ -21,20 +49,37 @@ class Locations:
             return
         hospitals_dict = {}
 
-        for country in location_metadata:
-            country_dict = {}
-            for provider_category in location_metadata[country]:
-                for hospital_name in tqdm.tqdm(location_metadata[country][provider_category], desc=f'{country} {provider_category}'):
-                    hospital_data = self.get_gmaps_data(
-                        hospital_name, provider_category, country)
-                    hospitals_dict[hospital_name] = hospital_data
-                    country_dict[hospital_name] = hospital_data
+        jobs = [(country, provider_category, hospital_name)
+                for country in location_metadata
+                for provider_category in location_metadata[country]
+                for hospital_name in location_metadata[country][provider_category]]
+        self.registry = IdRegistry(self.uuids_path)
+        if self.cache is not None:
+            self.cache.evict()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(tqdm.tqdm(executor.map(self._get_location, jobs), total=len(jobs), desc='locations'))
+        finally:
+            self.registry.flush()
+
+        countries = {country: {} for country in location_metadata}
+        for (country, _, hospital_name), hospital_data in zip(jobs, results):
+            if hospital_data is None:
+                continue
+            if hospital_data['locationID'] is not None:
+                # Another job may have registered the name first
+                hospital_data['locationID'] = self.registry.get(hospital_name)
+            hospitals_dict[hospital_name] = hospital_data
+            countries[country][hospital_name] = hospital_data
+        for country, country_dict in countries.items():
             df = pd.json_normalize(list(country_dict.values()))
             save_export(f'{country}_hospitals_raw', df)
+        print(f'{self.requests} Google Maps requests, {self.cache_hits} results from cache')
 
         # Saves as one big file, unsure if this is still needed 
         # self.save(hospitals_dict)
         # self.export_csv(hospitals_dict)
+        return hospitals_dict
 
     def save(self, dictionary):
         try:
@@ -47,30 +92,42 @@ class Locations:
         df.to_csv('pipeline/resources/locations.csv')
 
     def _get_locationID(self, locationName):
-        uuids = 'pipeline/resources/uuids.json'
-        d = utils.open_dictionary(uuids)
-        updated = False
-
-        if locationName not in d:
-            d[locationName] = str(uuid.uuid4())
-            updated = True
+        if self.registry is None:
+            self.registry = IdRegistry(self.uuids_path)
+        return self.registry.get(locationName)
 
-        if updated:
-            utils.save_dictionary(d, uuids)
-
-        return d[locationName]
+    def _get_location(self, job):
+        country, provider_category, hospital_name = job
+        try:
+            return self.get_gmaps_data(hospital_name, provider_category, country)
+        except Exception as e:
+            print(f'Error: {hospital_name} ({e})')
+            return None
+
+    def _get_json(self, kind, key, url) -> dict:
+        """ Returns the API result for (kind, key) from the cache, else from url. """
+        if self.cache is not None:
+            result = self.cache.get(kind, key)
+            if result is not None:
+                with self._lock:
+                    self.cache_hits += 1
+                return result
+        result = sessions.get(url, stage='geocode').json()
+        with self._lock:
+            self.requests += 1
+        if self.cache is not None and result.get('status') in CACHED_STATUSES:
+            self.cache.store(kind, key, result)
+        return result
 
     def get_gmaps_data(self, location_query, provider_category, country) -> dict:
         """ This function will make the Google Geocoder API call to collect information and returns a dictionary. """
 
         key = environ.get('GOOGLE_API_KEY')
-        country_iso_remapper = open_dictionary(
-            'pipeline/resources/schema.json')['country_isos']
-        location_query_with_country = f'{location_query} {country_iso_remapper[country]}'
+        location_query_with_country = f'{location_query} {self.country_isos[country]}'
         search_address = '+'.join(location_query_with_country.split(' '))
-        resp = requests.get(
-            f'https://maps.googleapis.com/maps/api/geocode/json?address={search_address}&key={key}')
-        resp = resp.json()
+        resp = self._get_json(
+            'geocode', location_query_with_country,
+            f'{self.base_url}/maps/api/geocode/json?address={search_address}&key={key}')
 
         hospital = {
             'locationID': None,
@@ -88,33 +145,33 @@ class Locations:
             'providerCategory': provider_category,
         }
 
-        if resp['status'] == 'ZERO_RESULTS':
+        if resp['status'] != 'OK':
+            if resp['status'] != 'ZERO_RESULTS':
+                print(f'Error: geocoding {location_query} returned {resp["status"]}')
             return hospital
 
         hospitalData = resp['results'][0]
 
         place_id = hospitalData['place_id']
-        place_details = requests.get(
-            f'https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&key={key}')
-        place_details = place_details.json()
+        # One details request for the phone, website and opening hours
+        place_details = self._get_json(
+            'details', f'{place_id}?fields={DETAILS_FIELDS}',
+            f'{self.base_url}/maps/api/place/details/json?place_id={place_id}&fields={DETAILS_FIELDS}&key={key}')
 
+        details = place_details.get('result', {})
         hospital['locationID'] = self._get_locationID(hospital['locationName'])
         self.set_value(
-            'phoneNumber', place_details["result"], "international_phone_number", hospital, location_query)
+            'phoneNumber', details, "international_phone_number", hospital, location_query)
         self.set_value(
-            'website', place_details["result"], "website", hospital, location_query)
+            'website', details, "website", hospital, location_query)
         self.set_value(
             'longitude', hospitalData['geometry']['location'], 'lng', hospital, location_query)
         self.set_value(
             'latitude', hospitalData['geometry']['location'], 'lat', hospital, location_query)
         self.set_value('location', hospitalData,
                        'formatted_address', hospital, location_query)
-
-        hours = requests.get(
-            f'https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&key={key}&fields=opening_hours')
-        hours = hours.json()
         self.set_value(
-            'hoursOperation', hours["result"], "opening_hours", hospital, location_query)
+            'hoursOperation', details, "opening_hours", hospital, location_query)
 
         for component in hospitalData['address_components']:
             for k, v in component.items():
@@ -1,16 +1,15 @@
-import time
 import traceback
 from string import ascii_uppercase
 
 import lxml.html
 import pandas as pd
-import requests
 import tqdm
-from fake_useragent import UserAgent
-from numpy.core.defchararray import strip
+from pipeline.common import sessions
+from pipeline.common.crawler import DEFAULT_CONCURRENCY, iter_links
+from pipeline.common.fetcher import AsyncDoctorFetcher
 from pipeline.common.translator import Translator
-from pipeline.models.doctor import Doctor
-from selenium import webdriver
+from pipeline.common.xpaths import get_grouped_plan
+from pipeline.models.doctor import DoctorBatch, DoctorRecord
 
 
 class HospitalAngeles:
@@ -22,41 +21,32 @@ class HospitalAngeles:
         doctor_urls = self._get_doctor_urls(
             'https://hospitalesangeles.com/indice_directorio.php?letra=')
 
-        doctors = []
-        for url in tqdm.tqdm(doctor_urls, 'Scraping doctors'):
-            try:
-                doctor = Doctor(self.metadata, 'static', url)
-                doctors.append(doctor.extract_doctor_information())
-            except Exception as e:
-                print(e)
-        df = pd.DataFrame(doctors)
-        translator = Translator(df, self.metadata['hospital_short_name'])
-        df = translator.translate()
+        df = AsyncDoctorFetcher(self.metadata).scrape(
+            doctor_urls, transform=self._translate)
         return df
 
+    def _translate(self, df):
+        translator = Translator(df, self.metadata['hospital_short_name'])
+        return translator.translate()
+
     def _get_doctor_urls(self, base_url):
-        """ Gets list of doctors by iterating through alphabet pages """
-        alpha_pages = []
-        for c in tqdm.tqdm(ascii_uppercase, 'Collecting doctor urls'):
-            try:
-                resp = requests.get(base_url + c)
-                tree = lxml.html.fromstring(resp.content)
-                doctors = [
-                    i.replace(' ', '%20')[10:] for i in tree.xpath('//div[contains(@class, "nombre")]/a/@href')
-                    if i != '#']
-                alpha_pages += [
-                    f'https://hospitalesangeles.com/paginaprofesional.php?{doctor.strip()}' for doctor in doctors]
-            except Exception as e:
-                print(e)
-        return alpha_pages
+        """ Returns an async iterator of doctor urls, crawling the alphabet pages concurrently
+        so doctor pages are fetched while later letters are still loading. """
+        letter_urls = [base_url + c for c in ascii_uppercase]
+        return iter_links(letter_urls, self._doctors_on_letter_page,
+                          concurrency=int(self.metadata.get('concurrency', DEFAULT_CONCURRENCY)))
+
+    def _doctors_on_letter_page(self, resp):
+        tree = lxml.html.fromstring(resp.content)
+        doctors = [
+            i.replace(' ', '%20')[10:] for i in tree.xpath('//div[contains(@class, "nombre")]/a/@href')
+            if i != '#']
+        return [f'https://hospitalesangeles.com/paginaprofesional.php?{doctor.strip()}' for doctor in doctors]
 
 
 class AmerimedHospital:
     def __init__(self, metadata):
         self.metadata = metadata
-        self.doctor = Doctor(metadata, 'class_methods_not_in_use')
-        self.doctor_information = self.doctor.doctor_information
-        self.doctor_information['city'] = self.metadata['city']
 
     def scrape(self):
         url = 'https://www.amerimedcancun.com/directorio-medico.php?_pagi_pg=3&_pagi_pg='
@@ -66,26 +56,35 @@ class AmerimedHospital:
         return df
 
     def _extract_doctor_pages(self, url, num_pages):
-        self.doctor_information['website'] = url
+        """ Extracts every doctor card of the paginated directory in one pass per page. """
+        plan = get_grouped_plan(self.metadata['group_xpath'], self.metadata['xpaths'])
+        batch = DoctorBatch()
         for page in tqdm.tqdm(range(1, num_pages+1), 'Scraping doctors'):
             try:
-                resp = requests.get(
+                resp = sessions.get(
                     url+str(page), headers={"User-Agent": "XY"})
                 tree = lxml.html.fromstring(resp.content)
-                for column, xpath in self.metadata['xpaths'].items():
-                    if self.doctor_information[column] != None:
-                        self.doctor_information[column] += tree.xpath(xpath)
-                    else:
-                        self.doctor_information[column] = tree.xpath(xpath)
+                for fields in plan.extract(tree):
+                    record = DoctorRecord.for_hospital(self.metadata)
+                    record.update(dict(fields, website=url))
+                    batch.append(record)
             except Exception as e:
                 print(e)
-        return pd.DataFrame(self.doctor_information)
+        return batch.to_frame()
 
 
 class CentroMedico:
     def __init__(self, metadata: dict):
         self.metadata = metadata
-        self.driver = webdriver.Chrome()
+        self._driver = None
+
+    @property
+    def driver(self):
+        """ Chrome is only launched (and selenium imported) the first time the driver is used. """
+        if self._driver is None:
+            from selenium import webdriver
+            self._driver = webdriver.Chrome()
+        return self._driver
 
     def scrape(self):
         # self.driver.get(
@@ -100,7 +99,7 @@ class CentroMedico:
         #             self._selenium_centro_medico_extract_doctor_information(selenium_elements[i*6+j]))
         #     self.driver.find_element_by_xpath(
         #         '//*[@id="page-navi"]/a[252]').click()  # goes to next page
-        # df = pd.DataFrame(doctors)
+        # df = DoctorBatch(doctors).to_frame()
         # translator = Translator(df, self.metadata['hospital_short_name'])
         # df = translator.translate()
         return pd.DataFrame()
@@ -108,15 +107,15 @@ class CentroMedico:
     def _selenium_centro_medico_extract_doctor_information(self, selenium_element):
         selenium_element.find_element_by_tag_name('button').click()
 
-        doctor = Doctor(self.metadata, 'selenium_centromedico')
+        record = DoctorRecord.for_hospital(self.metadata)
         for column, xpath in self.metadata['xpaths'].items():
-            if doctor.doctor_information[column] not in (None, "Location"):
-                doctor.doctor_information[column] += self._add_element(
+            if record[column] not in (None, "Location"):
+                record[column] += self._add_element(
                     selenium_element, xpath)
             else:
-                doctor.doctor_information[column] = self._add_element(
+                record[column] = self._add_element(
                     selenium_element, xpath)
-        return doctor.doctor_information
+        return record
 
     def _add_element(self, doctor, xpath, element_num=0):
         try:
@@ -130,9 +129,6 @@ class CentroMedico:
 class AngelesHealth:
     def __init__(self, metadata):
         self.metadata = metadata
-        self.doctor = Doctor(metadata, 'class_methods_not_in_use')
-        self.doctor_information = self.doctor.doctor_information
-        self.doctor_information['city'] = self.metadata['city']
 
     def scrape(self):
         """ This method will first gather all of the individual doctor
@@ -144,23 +140,13 @@ class AngelesHealth:
         doctor_urls = self._get_doctor_urls(
             'https://www.angeleshealth.com/doctors-surgeons-angeles-hospital-tijuana/')
 
-        doctors = []
-        for url in tqdm.tqdm(doctor_urls, 'Scraping doctors'):
-            try:
-                doctor = Doctor(self.metadata, 'static', url)
-                doctors.append(doctor.extract_doctor_information())
-            except Exception as e:
-                print(e)
-        df = pd.DataFrame(doctors)
+        df = AsyncDoctorFetcher(self.metadata).scrape(doctor_urls)
         return df
 
     def _get_doctor_urls(self, base_url):
         """ Returns a list of doctors by sending a request and gathering all pages a/href() attribute xpath. """
-        self.doctor_information['websites'] = base_url
         url = 'https://www.angeleshealth.com/doctors-surgeons-angeles-hospital-tijuana/'
-        ua = UserAgent()
-        headers = {'User-Agent': str(ua.chrome)}
-        resp = requests.get(url, headers=headers)
+        resp = sessions.get(url)
         tree = lxml.html.fromstring(resp.content)
         doctor_urls = [url for url in tree.xpath(
             '//a/img/parent::a/@href')[1:-1]]
@@ -170,28 +156,17 @@ class AngelesHealth:
 class MedicaSur:
     def __init__(self, metadata):
         self.metadata = metadata
-        self.doctor = Doctor(metadata, 'class_methods_not_in_use')
-        self.doctor_information = self.doctor.doctor_information
-        self.doctor_information['city'] = self.metadata['city']
 
     def scrape(self):
+        """ Extracts every doctor of the single physicians page in one pass: the photo,
+        certifications and scientific work in each doctor's card are grouped with them. """
         url = 'https://info.healthtravelmexico.com/medical-services/our-physicians.html'
-        resp = requests.get(url)
+        resp = sessions.get(url)
         tree = lxml.html.fromstring(resp.content)
-        for column, xpath in self.metadata['xpaths'].items():
-            self.doctor_information[column] = tree.xpath(xpath)
-            if column == 'additionalInformation' or column == 'otherActivities':
-                self.doctor_information[column] = []
-                for name in self.doctor_information['name']:
-                    new_xpath = xpath.replace('NAME', name)
-                    values = tree.xpath(new_xpath)
-                    values = list(map(lambda x: " ".join(
-                        x.split()).replace("\n", ""), values))
-                    self.doctor_information[column].append(values)
-
-        df = pd.DataFrame(self.doctor_information)
-        df['otherActivities'] = df['otherActivities'].fillna(
-            '').apply(lambda x: '|'.join(x))
-        df['additionalInformation'] = df['additionalInformation'].fillna(
-            '').apply(lambda x: '|'.join(x))
-        return df
+        plan = get_grouped_plan(self.metadata['group_xpath'], self.metadata['xpaths'])
+        batch = DoctorBatch()
+        for fields in plan.extract(tree):
+            record = DoctorRecord.for_hospital(self.metadata)
+            record.update(fields)
+            batch.append(record)
+        return batch.to_frame()
@@ -0,0 +1,132 @@
+""" Reference implementations the cleaning tests (and benchmarks/cleaning_benchmark.py)
+check the cleaners against: the .str and apply chains the country cleaners ran before
+their columns moved to the rule specs, and the raw data they are run on.
+"""
+import math
+import re
+
+import pandas as pd
+from pipeline.cleaners.cleaner import CleanerUtils, CleaningSpec
+
+COUNTRIES = ['mx', 'cr', 'dr']
+RULE_COLUMNS = ['email', 'name', 'additionalInformation', 'otherActivities']
+
+
+def legacy_clean_provider(df, providers):
+    """ The cleaners' former _clean_provider (a missing provider, which made it fail, is
+    given as '' here). """
+    prov = (
+        df.provider
+        .fillna('')
+        .str.replace(r'\n|\r', '', regex=True)
+        .str.replace(',', '|')
+        .str.title().str.split('|')
+        .apply(lambda x: x if x is not None else [])
+        .apply(lambda x: [i.strip() for i in x])
+        .apply(lambda x: [i for i in x if i not in (None, 'And', '', ' ')])
+        .apply(lambda x: [i.replace(r' ', '') for i in x])
+        .apply(lambda x: [i if i is not None else [''] for i in x])
+        .apply(lambda x: [providers[i] if i in providers else i for i in x])
+        .apply(lambda x: [i for i in x if i is not None])
+        .apply(lambda x: [i.split(', ') for i in x])
+        .apply(lambda x: [j for i in x for j in i])
+        .apply(lambda x: sorted(set(x)))
+        .apply(lambda x: ', '.join((x)))
+    )
+    return prov.str.replace('  ', ' ')
+
+
+EMAIL_JUNK = ['हबिब्गिनेचो@होत्मैल.कॉम', ' जैमेक्लेइमन@याहू.कॉम', 'की_क्चल@याहू.कॉम', 'डॉ.रहलमिर@जीमेल.कॉम',
+              ' चर्मसोफ़@होत्मैल.कॉम', 'चर्मसोफ़@होत्मैल.कॉम', 'जुअन्सावेद्र@याहू.कॉम', 'जैमेक्लेइमन@याहू.कॉम']
+
+
+def legacy_clean_email(df):
+    """ The cleaners' former _clean_email. The regex flags are those pandas 1.1 used
+    (a pattern of several characters is a regex) and astype(str) is spelled map(str),
+    which is what it did to None. """
+    email = df['email'].map(str).str.replace(r"( )|(')", '', regex=True)
+    for text in ['mailto:', 'Malto:', 'Email:']:
+        email = email.str.replace(text, '', regex=True)
+    email = email.str.replace('\t', '', regex=False).str.replace('\n', '', regex=False)
+    for text in EMAIL_JUNK:
+        email = email.str.replace(text, '', regex=True)
+    return (email.str.strip()
+            .str.replace('|', ', ', regex=False)
+            .apply(lambda x: x if len(x.split('@')) == 2 and '' not in x.split('@') else None)
+            .str.replace(' ', '', regex=False))
+
+
+def legacy_clean_name(df):
+    name_pattern = r'(^Dr. )|(\sa\s)|(Dra. )|(DRA. )|(Lic. )|(DR. )|(LIC. )|(Drag. )|(Y )'
+    name = (
+        df['name'].str.replace(name_pattern, '', regex=True)
+        .str.title().str.strip()
+        .apply(lambda x: '' if x == None else x)
+        .str.replace(',', '', regex=False)
+        .str.replace('Dr.', '', regex=True)
+        .str.replace('M.D.', '', regex=True)
+        .str.replace('&', '', regex=False)
+        .str.replace('Under ', '', regex=True)
+        .str.replace('Where ', '', regex=True)
+        .str.replace('  ', ' ', regex=True))
+    first_name = name.map(str).str.split(' ').apply(lambda x: ' '.join(x[:math.ceil(len(x) / 2)]))
+    last_name = name.map(str).str.split(' ').apply(lambda x: ' '.join(x[math.ceil(len(x) / 2):]))
+    return (first_name + ' ' + last_name).str.replace('  ', ' ', regex=True)
+
+
+def legacy_clean_additionalInformation(df):
+    return (
+        df['additionalInformation']
+        .fillna('')
+        .str.strip()
+        .str.replace('|', ',', regex=False)
+        .str.replace('\r\n', '', regex=True)
+        .str.replace('  ', ' ', regex=True)
+        .apply(lambda x: re.sub(r'\s+', ' ', x) if type(x) == str else x)
+        .str.replace(r'\n', '', regex=True)
+        .str.replace(r'â', '', regex=False).str.replace(r'?', '', regex=False)
+        .str.strip().str.split('|')
+        .replace({'': None})
+        .apply(lambda x: ', '.join(x) if type(x) == list else x)
+        .apply(lambda x: re.sub(r'\s+', ' ', x) if type(x) == str else x)
+        .str.replace('  ', ' ', regex=True))
+
+
+def legacy_clean_otherActivities(df):
+    return (
+        df['otherActivities']
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+        .str.split('|')
+        .apply(lambda x: ', '.join([i.strip() for i in x]) if x is not None else x))
+
+
+LEGACY_COLUMNS = {
+    'email': legacy_clean_email,
+    'name': legacy_clean_name,
+    'additionalInformation': legacy_clean_additionalInformation,
+    'otherActivities': legacy_clean_otherActivities,
+}
+
+
+def raw_doctors(country) -> pd.DataFrame:
+    """ The country's raw files as the cleaners first format them, with None for missing cells. """
+    cleaner = CleanerUtils()
+    return cleaner.initial_formatting(cleaner.combine_raw_files(country).astype(object))
+
+
+def mexico_providers() -> pd.DataFrame:
+    return raw_doctors('mx')[['provider']]
+
+
+def spec_rules(country) -> dict:
+    """ The ColumnRules of RULE_COLUMNS in the country's spec. """
+    return {entry['column']: rules for entry, rules in CleaningSpec.load(country).entries
+            if rules is not None and entry['column'] in RULE_COLUMNS}
+
+
+def same_values(a: pd.Series, b: pd.Series) -> bool:
+    """ Equal values, a missing cell being equal to a missing cell whatever its type. """
+    def values(column):
+        return [None if isinstance(x, float) and math.isnan(x) else x for x in column]
+    return values(a) == values(b)
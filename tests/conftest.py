@@ -0,0 +1,26 @@
+import pytest
+from pipeline.common import ratelimit, sessions
+from pipeline.common.cache import ResponseCache
+
+
+@pytest.fixture(autouse=True)
+def isolated_sessions(tmp_path):
+    """ Every test gets a SessionPool caching under tmp_path and no host limits, so it
+    neither writes the shared response cache nor sees limits set by another test. The
+    previous pool and limits are restored afterwards. """
+    with sessions._session_pool_lock:
+        previous_pool = sessions._session_pool
+        sessions._session_pool = sessions.SessionPool(cache=ResponseCache(str(tmp_path / 'responses.sqlite3')))
+    with ratelimit._lock:
+        previous_limiters, previous_limits = dict(ratelimit._limiters), dict(ratelimit._limits)
+        ratelimit._limiters.clear()
+        ratelimit._limits.clear()
+    yield sessions._session_pool
+    with sessions._session_pool_lock:
+        sessions._session_pool.close()
+        sessions._session_pool = previous_pool
+    with ratelimit._lock:
+        ratelimit._limiters.clear()
+        ratelimit._limiters.update(previous_limiters)
+        ratelimit._limits.clear()
+        ratelimit._limits.update(previous_limits)
@@ -0,0 +1,90 @@
+import time
+
+import pytest
+from pipeline.common import sessions
+from pipeline.common.cache import ResponseCache
+from pipeline.common.standin import StandInServer
+from pipeline.common.utils import open_dictionary
+from pipeline.models.doctor import Doctor
+
+FIXTURE_PATH = 'pipeline/benchmarks/fixtures/cima_doctor.html'
+METADATA_PATH = 'pipeline/resources/hospitals_metadata/costarica.json'
+
+
+class ETagServer(StandInServer):
+    """ Stand-in server that answers If-None-Match with 304. """
+
+    def __init__(self, pages):
+        super().__init__(pages)
+        self.not_modified = 0
+
+    def respond(self, method, path, headers, body):
+        status, response_headers, content = super().respond(
+            method, path, headers, body)
+        etag = f'"{hash(content)}"'
+        if status == 200 and headers.get('If-None-Match') == etag:
+            self.not_modified += 1
+            return 304, {'ETag': etag}, b''
+        response_headers['ETag'] = etag
+        return status, response_headers, content
+
+
+@pytest.fixture
+def cached_pool(tmp_path):
+    return sessions.configure(cache=ResponseCache(str(tmp_path / 'cache.sqlite3')))
+
+
+def test_cache_revalidates_with_etag(cached_pool):
+    """ Second request is a conditional GET answered by a 304 and served from disk. """
+    with ETagServer({'/doctor': 'Dr. House'}) as server:
+        first = sessions.get(server.url('/doctor'))
+        second = sessions.get(server.url('/doctor'))
+    assert not first.from_cache
+    assert second.from_cache
+    assert second.status_code == 200
+    assert second.text == 'Dr. House'
+    assert server.not_modified == 1
+
+
+def test_cache_key_includes_body(cached_pool):
+    assert ResponseCache.key('POST', 'https://a', '{"id": 1}') != ResponseCache.key(
+        'POST', 'https://a', '{"id": 2}')
+
+
+def test_doctor_reuses_fields_for_unchanged_page(cached_pool, monkeypatch):
+    """ A 304 page is not parsed again. """
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        page = f.read()
+    metadata = open_dictionary(METADATA_PATH)['HospitalCima']
+    with ETagServer({'/en/doctor/1': page}) as server:
+        url = server.url('/en/doctor/1')
+        first = Doctor(metadata, 'static', url).extract_doctor_information()
+        monkeypatch.setattr('lxml.html.fromstring', None)
+        second = Doctor(metadata, 'static', url).extract_doctor_information()
+    assert first == second
+    assert server.not_modified == 1
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_size=10)
+    with ETagServer({'/a': '123456', '/b': '654321'}) as server:
+        pool = sessions.SessionPool(cache=cache)
+        pool.get(server.url('/a'))
+        time.sleep(0.01)
+        pool.get(server.url('/b'))
+    assert cache.conditional_headers(ResponseCache.key('GET', server.url('/a'))) == {}
+    assert cache.conditional_headers(ResponseCache.key('GET', server.url('/b'))) != {}
+
+
+def test_cache_evicts_only_when_due(tmp_path, monkeypatch):
+    """ Stores under the size budget keep a running total instead of scanning the table. """
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'), max_size=10 ** 6)
+    evictions = []
+    monkeypatch.setattr(cache, '_evict', lambda conn: evictions.append(conn))
+    with ETagServer({f'/{i}': f'page {i}' for i in range(20)}) as server:
+        pool = sessions.SessionPool(cache=cache)
+        for i in range(20):
+            pool.get(server.url(f'/{i}'))
+        pool.get(server.url('/0'))
+    assert evictions == []
+    assert cache._size == sum(len(f'page {i}') for i in range(20))
@@ -159,3 +159,59 @@ def test_doctorid():
     dfs = clean_setup()
     for df in dfs:
         assert df.doctorId.apply(lambda x: is_valid_uuid(x)).all()
+
+
+def test_normalize_providers_matches_apply_chain():
+    """ The shared provider normalization gives what the cleaners' apply chain gave. """
+    from pipeline.tests.cleaning_reference import legacy_clean_provider, mexico_providers
+    from pipeline.cleaners.cleaner import normalize_providers, providers_remapper
+
+    df = mexico_providers()
+    assert normalize_providers(df['provider'], providers_remapper()).equals(
+        legacy_clean_provider(df, providers_remapper()))
+
+
+def test_column_rules_match_str_chains():
+    """ The column rules of the country specs give what the cleaners' .str chains gave. """
+    from pipeline.tests.cleaning_reference import COUNTRIES, LEGACY_COLUMNS, raw_doctors, same_values, spec_rules
+
+    for country in COUNTRIES:
+        df = raw_doctors(country)
+        for column, rules in spec_rules(country).items():
+            assert same_values(rules.apply(df[column]), LEGACY_COLUMNS[column](df)), (country, column)
+
+
+def test_column_rules_fuse_deletions():
+    """ Consecutive single-character removals run as one step, missing cells only reach
+    the rules that fill them. """
+    from pipeline.cleaners.cleaner import ColumnRules
+
+    rules = ColumnRules([['replace', ',', ''], ['delete', '.&'], ['strip'], ['fillna', 'n/a'], ['title']])
+    assert rules.rules == [['delete', ',.&'], ['strip'], ['fillna', 'n/a'], ['title']]
+    column = pd.Series([' a.b, c& ', None, ' a.b, c& '], index=[3, 5, 7])
+    assert rules.apply(column).tolist() == ['Ab C', 'N/A', 'Ab C']
+    assert rules.apply(column).index.tolist() == [3, 5, 7]
+
+
+def test_name_and_email_kernels():
+    """ One pass cleans a name into 'first last' and an email into a valid address or None. """
+    from pipeline.cleaners.cleaner import ColumnRules
+
+    name = ColumnRules([['clean_name', r'(^Dr. )|(Dra. )', [',', 'M.D.']]])
+    assert name.apply(pd.Series(['Dr. juan  carlos PEREZ,', None])).tolist() == ['Juan Carlos Perez', ' ']
+    email = ColumnRules([['astype_str'], ['clean_email', ['mailto:']]])
+    assert email.apply(pd.Series([" mailto:'ana@example.com'\n", 'ana@', None])).tolist() == [
+        'ana@example.com', None, None]
+
+
+def test_kernels_remove_patterns_in_order():
+    """ Removing one pattern can form the next one, as it did in the cleaners' chains. """
+    from pipeline.tests.cleaning_reference import legacy_clean_email, legacy_clean_name, spec_rules
+
+    df = pd.DataFrame({'name': ['Dr,. Ana Lopez', 'D,r.x Ana Lopez', 'Ana &Under Lopez'],
+                       'email': ['mail\tto:ana@example.com', "Mal'to:ana@example.com", 'Email:\nana@example.com']})
+    rules = spec_rules('mx')
+    assert rules['name'].apply(df['name']).tolist() == legacy_clean_name(df).tolist()
+    assert rules['name'].apply(df['name'])[0] == ' Ana Lopez'  # 'Dr.' formed once ',' is gone
+    assert rules['email'].apply(df['email']).tolist() == legacy_clean_email(df).tolist()
+    assert rules['email'].apply(df['email'])[0] == 'mailto:ana@example.com'
@@ -0,0 +1,272 @@
+import asyncio
+import json
+import os
+
+import pandas as pd
+import pipeline.paths
+import pytest
+from pipeline.common import crawler, incremental, orchestrator, sink, telemetry
+from pipeline.common.fetcher import AsyncDoctorFetcher
+from pipeline.common.standin import StandInServer
+from pipeline.common.utils import open_dictionary
+from pipeline.models.doctor import DoctorBatch, DoctorRecord
+
+FIXTURE_PATH = 'pipeline/benchmarks/fixtures/cima_doctor.html'
+METADATA_PATH = 'pipeline/resources/hospitals_metadata/costarica.json'
+
+
+def fetcher_setup():
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        page = f.read()
+    metadata = open_dictionary(METADATA_PATH)['HospitalCima']
+    pages = {f'/en/doctor/{i}': page for i in range(20)}
+    return metadata, pages
+
+
+def test_fetcher_keeps_url_order_and_columns():
+    """ Concurrent scrape returns one row per url, in url order, with Doctor's columns. """
+    metadata, pages = fetcher_setup()
+    with StandInServer(pages) as server:
+        doctor_urls = [server.url(path) for path in pages]
+        df = AsyncDoctorFetcher(metadata, concurrency=4).scrape(doctor_urls)
+    assert list(df['website']) == doctor_urls
+    assert (df['name'] == 'Dr. Ana Lucia Vargas Solano').all()
+    assert df['provider'].iloc[0] == 'Cardiology|Internal Medicine'
+
+
+def test_fetcher_skips_failing_urls():
+    """ A url that cannot be fetched is skipped, not fatal. """
+    metadata, pages = fetcher_setup()
+    with StandInServer(pages) as server:
+        doctor_urls = [server.url(path) for path in pages]
+        doctor_urls.insert(3, 'http://127.0.0.1:1/unreachable')
+        df = AsyncDoctorFetcher(metadata, concurrency=4).scrape(doctor_urls)
+    assert len(df) == len(pages)
+
+
+def test_incremental_scrape_merges_only_changed_doctors(tmp_path, monkeypatch):
+    """ Second run re-extracts only the changed page and merges it into the raw file. """
+    monkeypatch.setattr(pipeline.paths, 'DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(pipeline.paths, 'INDEX_PATH', str(tmp_path / 'index.json'))
+    monkeypatch.setattr(pipeline.paths, 'FINGERPRINTS_PATH', str(tmp_path / 'fingerprints'))
+    (tmp_path / 'cr').mkdir()
+    (tmp_path / 'index.json').write_text(json.dumps({'cr': {'raw': {}}}))
+
+    metadata, pages = fetcher_setup()
+    with StandInServer(pages) as server:
+        class StandInHospital:
+            def __init__(self, metadata):
+                self.metadata = metadata
+
+            def scrape(self):
+                doctor_urls = [server.url(path) for path in pages]
+                return AsyncDoctorFetcher(self.metadata).scrape(doctor_urls)
+
+        first = incremental.scrape_incremental(StandInHospital, metadata)
+        assert incremental.scrape_incremental(StandInHospital, metadata) is None  # fresh
+        pages['/en/doctor/3'] = pages['/en/doctor/3'].replace('Ana Lucia', 'Maria')
+        del pages['/en/doctor/5']
+        second = incremental.scrape_incremental(StandInHospital, metadata, force=True)
+
+    raw = sink.read_raw_file(sink.raw_path('cr', 'cima'))
+    assert first == 20
+    assert second == 1
+    assert len(raw) == 19
+    assert (raw['name'] == 'Dr. Maria Vargas Solano').sum() == 1
+
+
+def test_incremental_fallback_merges_returned_doctors(tmp_path, monkeypatch):
+    """ A scraper returning a DataFrame upserts its doctors into the raw file, and one
+    returning no doctors leaves the raw file as it was. """
+    monkeypatch.setattr(pipeline.paths, 'DATA_PATH', str(tmp_path))
+    monkeypatch.setattr(pipeline.paths, 'INDEX_PATH', str(tmp_path / 'index.json'))
+    (tmp_path / 'cr').mkdir()
+    (tmp_path / 'index.json').write_text(json.dumps({'cr': {'raw': {}}}))
+    metadata = open_dictionary(METADATA_PATH)['HospitalCima']
+    returned = [pd.DataFrame({'name': ['A', 'B'], 'website': ['/a', '/b']}),
+                pd.DataFrame({'name': ['B2'], 'website': ['/b']}),
+                pd.DataFrame()]
+
+    class DataFrameHospital:
+        def __init__(self, metadata):
+            pass
+
+        def scrape(self):
+            return returned.pop(0)
+
+    counts = [incremental.scrape_incremental(DataFrameHospital, metadata, force=True) for _ in range(3)]
+    raw = sink.read_raw_file(sink.raw_path('cr', 'cima'))
+    assert counts == [2, 1, 0]
+    assert sorted(raw['name']) == ['A', 'B2']
+
+
+def test_streaming_scrape_writes_ndjson_chunks(tmp_path, monkeypatch):
+    """ Doctors are written to the raw NDJSON file per chunk, with the transform applied per chunk. """
+    monkeypatch.setattr(pipeline.paths, 'DATA_PATH', str(tmp_path))
+    (tmp_path / 'cr').mkdir()
+    metadata, pages = fetcher_setup()
+    chunk_sizes = []
+
+    def transform(df):
+        chunk_sizes.append(len(df))
+        return df
+
+    with StandInServer(pages) as server:
+        class StandInHospital:
+            def __init__(self, metadata):
+                self.metadata = metadata
+
+            def scrape(self):
+                doctor_urls = [server.url(path) for path in pages]
+                return AsyncDoctorFetcher(self.metadata).scrape(doctor_urls, transform=transform)
+
+        count = sink.scrape_to_raw_file(StandInHospital, dict(metadata, chunk_size=8))
+
+    assert count == 20
+    assert chunk_sizes == [8, 8, 4]
+    assert len(sink.read_raw_file(sink.raw_path('cr', 'cima'))) == 20
+
+
+def test_streaming_scrape_resumes_a_crashed_partial_file(tmp_path, monkeypatch):
+    """ Doctors already in the partial file of a crashed scrape are kept and not fetched
+    again; a half-written last line is dropped. """
+    monkeypatch.setattr(pipeline.paths, 'DATA_PATH', str(tmp_path))
+    (tmp_path / 'cr').mkdir()
+    metadata, pages = fetcher_setup()
+
+    with StandInServer(pages) as server:
+        class StandInHospital:
+            def __init__(self, metadata):
+                self.metadata = metadata
+
+            def scrape(self):
+                doctor_urls = [server.url(path) for path in pages]
+                return AsyncDoctorFetcher(self.metadata).scrape(doctor_urls)
+
+        partial_path = sink.raw_path('cr', 'cima') + '.partial'
+        with open(partial_path, 'w', encoding='utf-8') as f:
+            for i in range(5):
+                f.write(json.dumps({'name': 'Resumed', 'website': server.url(f'/en/doctor/{i}')}) + '\n')
+            f.write('{"name": "Half wri')
+        count = sink.scrape_to_raw_file(StandInHospital, metadata)
+        requests_served = server.requests_served
+
+    raw = sink.read_raw_file(sink.raw_path('cr', 'cima'))
+    assert count == 20 and len(raw) == 20 and raw['website'].is_unique
+    assert (raw['name'] == 'Resumed').sum() == 5
+    assert requests_served == 15
+
+
+def test_scrape_without_doctors_fails_and_keeps_the_raw_file(tmp_path, monkeypatch):
+    """ A scrape that finds no doctor is reported as failed and leaves the raw file, and
+    a legacy .json next to it, untouched. """
+    monkeypatch.setattr(pipeline.paths, 'DATA_PATH', str(tmp_path))
+    (tmp_path / 'cr').mkdir()
+    metadata, _ = fetcher_setup()
+    path = sink.raw_path('cr', 'cima')
+    sink.write_raw_file(path, pd.DataFrame([{'name': 'Kept', 'website': 'https://cima/0'}]))
+    legacy_path = path[:-len('.jsonl')] + '.json'
+    with open(legacy_path, 'w', encoding='utf-8') as f:
+        f.write('[]')
+
+    class EmptyHospital:
+        def __init__(self, metadata):
+            self.metadata = metadata
+
+        def scrape(self):
+            return pd.DataFrame()
+
+    monkeypatch.setattr(orchestrator, 'resolve_scraper', lambda country, class_name: EmptyHospital)
+    result = orchestrator.run_hospital('cr', 'HospitalCima', metadata)
+
+    assert result['status'] == 'failed' and result['doctors'] == 0
+    assert sink.read_raw_file(path)['name'].tolist() == ['Kept']
+    assert os.path.isfile(legacy_path) and not os.path.isfile(path + '.partial')
+
+
+def test_two_level_crawl_dedups_doctor_urls():
+    """ Doctors listed under several index pages are fetched once, in one overlapping crawl. """
+    metadata, pages = fetcher_setup()
+    with StandInServer(pages) as server:
+        def links(resp):
+            return [server.url(f'/en/doctor/{i}') for i in resp.text.split(',')]
+
+        server.pages['/specialty/a'] = '0,1,2,3,4,5,6,7,8,9'
+        server.pages['/specialty/b'] = '5,6,7,8,9,10,11,12'
+        server.pages['/specialty/c'] = '0,12,13,14,15,16,17,18,19'
+        index_urls = [server.url(f'/specialty/{c}') for c in 'abc']
+        doctor_urls = crawler.iter_links(index_urls, links, concurrency=2)
+        df = AsyncDoctorFetcher(metadata, concurrency=4).scrape(doctor_urls)
+        requests_served = server.requests_served
+
+    assert len(df) == 20
+    assert df['website'].is_unique
+    assert requests_served == 3 + 20
+
+
+def test_crawl_holds_back_fetches_for_a_slow_consumer():
+    """ At most `concurrency` results are running or waiting while the consumer is busy,
+    and an error of the url iterator ends the crawl with that error. """
+    started = []
+
+    async def urls():
+        for i in range(20):
+            yield f'https://example.com/{i}'
+        raise ValueError('index page broke')
+
+    async def consume():
+        consumed = []
+        async for index, _, _ in crawler.iter_completed(urls(), started.append, concurrency=3):
+            await asyncio.sleep(0.01)
+            assert len(started) <= len(consumed) + 1 + 3
+            consumed.append(index)
+        return consumed
+
+    with pytest.raises(ValueError, match='index page broke'):
+        asyncio.run(consume())
+    assert len(started) == 20
+
+
+def test_telemetry_records_requests_bytes_and_latencies():
+    """ A scrape reports requests, bytes, status codes and latency percentiles per stage. """
+    metadata, pages = fetcher_setup()
+    with StandInServer(pages) as server:
+        doctor_urls = [server.url(path) for path in pages] + [server.url('/en/doctor/missing')]
+        telemetry.begin('cr/cima')
+        df = AsyncDoctorFetcher(metadata, concurrency=4).scrape(doctor_urls)
+        report = telemetry.end(len(df))
+
+    doctor = report['stages']['doctor']
+    assert doctor['requests'] == len(pages) + 1
+    assert doctor['status_codes'] == {'200': len(pages), '404': 1}
+    assert doctor['bytes'] >= sum(len(page.encode('utf-8')) for page in pages.values())
+    assert 0 < doctor['fetch_seconds']['p50'] <= doctor['fetch_seconds']['p99']
+    assert doctor['parse_seconds']['p95'] is not None
+    assert report['doctors_per_second'] > 0
+    prometheus = telemetry.to_prometheus([report])
+    assert 'carpemed_scrape_responses_total{hospital="cr/cima",stage="doctor",code="404"} 1' in prometheus
+    assert f'carpemed_scrape_fetch_seconds_count{{hospital="cr/cima",stage="doctor"}} {len(pages) + 1}' in prometheus
+    assert 'carpemed_scrape_parse_seconds_sum{hospital="cr/cima",stage="doctor"} ' in prometheus
+
+
+def test_percentiles_use_the_nearest_rank():
+    """ p-th percentile is the smallest value with p% of the sample at or below it. """
+    assert telemetry.percentiles(range(100, 0, -1)) == {'p50': 50, 'p95': 95, 'p99': 99}
+    assert telemetry.percentiles([4, 1, 3, 2]) == {'p50': 2, 'p95': 4, 'p99': 4}
+    assert telemetry.percentiles([7]) == {'p50': 7, 'p95': 7, 'p99': 7}
+    assert telemetry.percentiles([]) == {'p50': None, 'p95': None, 'p99': None}
+
+
+def test_doctor_batch_builds_schema_columns():
+    """ Records fill a columnar batch whose frame has every schema.json doctor field. """
+    metadata = open_dictionary(METADATA_PATH)['HospitalCima']
+    records = [DoctorRecord.for_hospital(metadata) for _ in range(3)]
+    for i, record in enumerate(records):
+        record.update({'name': f'Dr. {i}', 'website': f'https://example.com/{i}'})
+    doctor_fields = open_dictionary('pipeline/resources/schema.json')['doctor_fields']
+
+    df = DoctorBatch(records).to_frame(doctor_fields)
+    assert list(df.columns) == doctor_fields
+    assert list(df['name']) == ['Dr. 0', 'Dr. 1', 'Dr. 2']
+    assert (df['location'] == 'Hospital CIMA').all() and not df['confirmedHours'].any()
+    assert not hasattr(records[0], '__dict__')
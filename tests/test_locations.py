@@ -0,0 +1,78 @@
+import json
+from urllib.parse import parse_qs, urlsplit
+
+from pipeline.common import sessions
+from pipeline.common.places_cache import PlacesCache
+from pipeline.common.registry import IdRegistry
+from pipeline.common.standin import StandInServer
+from pipeline.scrapers import locations
+from pipeline.scrapers.locations import Locations
+
+
+class MapsStandIn(StandInServer):
+    """ Stand-in for the geocoding and place details APIs, one place per hospital. """
+
+    def __init__(self):
+        super().__init__()
+        self.paths = []
+
+    def respond(self, method, path, headers, body):
+        self.paths.append(path)
+        url = urlsplit(path)
+        query = parse_qs(url.query)
+        if url.path == '/maps/api/geocode/json':
+            name = query['address'][0].rsplit(' ', 1)[0]
+            result = {'status': 'OK', 'results': [{
+                'place_id': name, 'formatted_address': f'{name}, Cancún',
+                'geometry': {'location': {'lat': 21.1, 'lng': -86.8}},
+                'address_components': [{'long_name': 'Cancún', 'types': ['locality']},
+                                       {'long_name': 'Mexico', 'types': ['country']}]}]}
+        else:
+            result = {'status': 'OK', 'result': {
+                'international_phone_number': '+52 998 881 3400', 'website': 'https://example.com',
+                'opening_hours': {'weekday_text': ['Monday: Open 24 hours']}}}
+        return 200, {'Content-Type': 'application/json'}, json.dumps(result).encode('utf-8')
+
+
+def test_locations_are_fetched_once_and_then_cached(tmp_path, monkeypatch):
+    """ One geocode and one details request per hospital, none on the second run, and
+    expired results are evicted. """
+    metadata = tmp_path / 'locations_metadata.json'
+    metadata.write_text(json.dumps({'mx': {'Hospitals': ['Hospital A', 'Hospital B', 'Hospital C']}}))
+    uuids = tmp_path / 'uuids.json'
+    uuids.write_text('{}')
+    monkeypatch.setattr(locations, 'save_export', lambda name, df: None)
+    sessions.configure(cache=None)
+    cache = PlacesCache(str(tmp_path / 'places.sqlite3'))
+    cache.store('geocode', 'Closed Hospital', {'status': 'OK', 'results': []})
+    cache._connect().execute('UPDATE places SET stored_at = 0')  # expired long ago
+
+    with MapsStandIn() as server:
+        first = Locations(str(metadata), cache, server.base_url, uuids_path=str(uuids)).aggregate_locations()
+        second = Locations(str(metadata), cache, server.base_url, uuids_path=str(uuids))
+        assert second.aggregate_locations() == first
+
+    assert len(server.paths) == 6 and second.requests == 0 and second.cache_hits == 6
+    assert len(cache) == 6  # the expired entry was evicted
+    assert all('fields=international_phone_number,website,opening_hours' in path
+               for path in server.paths if 'details' in path)
+    hospital = first['Hospital B']
+    assert hospital['phoneNumber'] == '529988813400'
+    assert hospital['hoursOperation'] == ['Monday: Open 24 hours']
+    assert hospital['city'] == 'Cancún' and hospital['country'] == 'Mexico'
+    assert len(set(h['locationID'] for h in first.values())) == 3
+
+
+def test_registry_flushes_merge_concurrent_jobs(tmp_path):
+    """ Two jobs flushing the same uuids file keep each other's ids, and the first id
+    given to a name wins. """
+    path = str(tmp_path / 'uuids.json')
+    mexico, costa_rica = IdRegistry(path), IdRegistry(path)
+    mexico.ids(['Hospital A', 'Shared'])
+    costa_rica.ids(['Hospital B', 'Shared'])
+    shared = mexico.get('Shared')
+
+    assert mexico.flush() == 2 and costa_rica.flush() == 1
+    assert costa_rica.get('Shared') == shared
+    assert len(IdRegistry(path)) == 3 and IdRegistry(path).get('Hospital A') == mexico.get('Hospital A')
+    assert costa_rica.flush() == 0
@@ -0,0 +1,80 @@
+import time
+
+from pipeline.common import ratelimit, sessions
+from pipeline.common.ratelimit import HostLimiter
+from pipeline.common.standin import StandInServer
+
+
+class ThrottlingServer(StandInServer):
+    """ Stand-in server answering the first `throttled` requests with 429. """
+
+    def __init__(self, pages, throttled=1, retry_after='0.2'):
+        super().__init__(pages)
+        self.throttled = throttled
+        self.retry_after = retry_after
+
+    def respond(self, method, path, headers, body):
+        if self.throttled > 0:
+            self.throttled -= 1
+            return 429, {'Retry-After': self.retry_after}, b''
+        return super().respond(method, path, headers, body)
+
+
+def test_window_grows_when_healthy_and_halves_on_throttling():
+    """ Additive increase on healthy responses, multiplicative decrease on 429, 5xx and slow ones. """
+    limiter = HostLimiter(rate=None, concurrency=4, max_concurrency=8, latency_target=1.0)
+    for _ in range(8):
+        limiter.acquire()
+        limiter.release(200, 0.1)
+    assert 5 < limiter.window <= 8
+
+    window = limiter.window
+    limiter.acquire()
+    limiter.release(500, 0.1)
+    assert limiter.window == window / 2
+
+    limiter.acquire()
+    limiter.release(200, 2.0)
+    assert limiter.window == window / 4
+    assert limiter.stats == {'requests': 10, 'throttled': 0, 'errors': 1, 'slow': 1}
+
+
+def test_token_bucket_paces_requests():
+    """ With a burst of 1, requests beyond the first wait for a token. """
+    limiter = HostLimiter(rate=20, burst=1, concurrency=8)
+    start = time.monotonic()
+    for _ in range(5):
+        limiter.acquire()
+        limiter.release(200, 0.0)
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+def test_throttled_request_is_resent_after_retry_after():
+    """ A 429 pauses the host for Retry-After and the request is resent through the pool. """
+    sessions.configure(cache=None)
+    with ThrottlingServer({'/doctor/1': b'<html>ok</html>'}) as server:
+        ratelimit.configure_host('127.0.0.1', rate=None, concurrency=4)
+        start = time.monotonic()
+        resp = sessions.get(server.url('/doctor/1'))
+        elapsed = time.monotonic() - start
+        limiter = ratelimit.get_limiter(server.url('/doctor/1'))
+
+    assert resp.status_code == 200
+    assert elapsed >= 0.2
+    assert server.requests_served == 2
+    assert limiter.stats['throttled'] == 1
+    assert limiter.window == 2.5
+
+
+def test_hospitals_on_one_host_share_its_budget():
+    """ Worker processes scraping the same host split its rate and concurrency. """
+    from pipeline.common.orchestrator import find_hospitals, share_host_budgets
+
+    jobs = share_host_budgets(find_hospitals(), workers=8)
+    limits = {class_name: metadata.get('rate_limit') for _, class_name, metadata in jobs}
+    hospiten = [limit for class_name, limit in limits.items() if class_name.startswith('Hospiten')]
+    assert len(hospiten) == 3
+    assert abs(sum(limit['rate'] for limit in hospiten) - 5) < 1e-9
+    assert sum(limit['max_concurrency'] for limit in hospiten) <= 8
+    assert limits['HospitalCima'] == {'hosts': ['directorio.hospitalcima.com'], 'rate': 5, 'max_concurrency': 8}
+    assert share_host_budgets(find_hospitals(), workers=1) == find_hospitals()
@@ -0,0 +1,65 @@
+from pipeline.common import sessions
+from pipeline.common.cache import ResponseCache
+from pipeline.common.fetcher import AsyncDoctorFetcher
+from pipeline.common.replay import HTTPArchive, ReplayServer, copy_url, repeat_body
+from pipeline.common.standin import StandInServer
+from pipeline.common.utils import open_dictionary
+
+FIXTURE_PATH = 'pipeline/benchmarks/fixtures/cima_doctor.html'
+METADATA_PATH = 'pipeline/resources/hospitals_metadata/costarica.json'
+
+
+def test_recorded_scrape_replays_offline(tmp_path):
+    """ A scrape recorded into an archive gives the same doctors when replayed, with the
+    live server gone, and copies of a url are served from the same recorded page. """
+    with open(FIXTURE_PATH, encoding='utf-8') as f:
+        page = f.read()
+    metadata = open_dictionary(METADATA_PATH)['HospitalCima']
+    pages = {f'/en/doctor/{i}': page for i in range(5)}
+
+    archive = HTTPArchive()
+    with StandInServer(pages) as server:
+        doctor_urls = [server.url(path) for path in pages]
+        sessions.configure(cache=None, archive=archive)
+        recorded = AsyncDoctorFetcher(metadata).scrape(doctor_urls)
+    archive.save(str(tmp_path / 'cima.zip'))
+
+    archive = HTTPArchive.load(str(tmp_path / 'cima.zip'))
+    assert len(archive) == 5 and len(archive.blobs) == 1
+    with ReplayServer(archive) as replay:
+        sessions.configure(cache=None, replay=replay)
+        replayed = AsyncDoctorFetcher(metadata).scrape(doctor_urls)
+        copies = AsyncDoctorFetcher(metadata).scrape([copy_url(doctor_urls[0], i) for i in range(3)])
+
+    assert replayed.equals(recorded)
+    assert (copies['name'] == recorded['name'][0]).all()
+    assert replay.missing == []
+
+
+
+class NotModifiedServer(StandInServer):
+    """ Stand-in server answering any conditional request with 304. """
+
+    def respond(self, method, path, headers, body):
+        if headers.get('If-None-Match'):
+            return 304, {'ETag': '"1"'}, b''
+        status, response_headers, content = super().respond(method, path, headers, body)
+        response_headers['ETag'] = '"1"'
+        return status, response_headers, content
+
+
+def test_recording_keeps_pages_served_from_the_cache(tmp_path):
+    """ A page revalidated with a 304 is recorded as the cached 200 it was served as. """
+    cache = ResponseCache(str(tmp_path / 'cache.sqlite3'))
+    with NotModifiedServer({'/doctor': 'Dr. House'}) as server:
+        sessions.configure(cache=cache).get(server.url('/doctor'))
+        archive = HTTPArchive()
+        resp = sessions.configure(cache=cache, archive=archive).get(server.url('/doctor'))
+
+    assert resp.from_cache
+    assert archive.lookup('GET', server.url('/doctor')) == (200, 'text/html; charset=utf-8', b'Dr. House')
+
+def test_repeat_body_scales_list_pages():
+    """ Repeating the body of a list page multiplies its entries, not the document. """
+    content = b'<html><head></head><body class="x"><li>a</li></body></html>'
+    assert repeat_body(content, 3) == b'<html><head></head><body class="x"><li>a</li><li>a</li><li>a</li></body></html>'
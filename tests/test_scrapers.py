@@ -0,0 +1,37 @@
+from pipeline.common import sessions
+from pipeline.common.replay import HTTPArchive, ReplayServer
+from pipeline.common.utils import open_dictionary
+from pipeline.scrapers.mx_scraper import MedicaSur
+
+MEXICO_METADATA_PATH = 'pipeline/resources/hospitals_metadata/mexico.json'
+
+
+def medicasur_page(doctors):
+    cards = ''.join(
+        f'<div class="col-md-6"><img class="width-40" src="/img/{i}.jpg">'
+        f'<span class="text-extra-dark-gray font-weight-600 text-small text-uppercase display-block alt-font">'
+        f'Dr. {i}</span><span class="text-black">Specialty {i}</span>'
+        f'<div><div><div><div><p>Certifications</p><ul><li>Board {i}</li><li>  Council\n {i}</li></ul>'
+        f'<p>Scientific work</p><ul><li>Paper {i}</li></ul></div></div></div></div></div>'
+        for i in range(doctors))
+    return (f'<html><body><span class="text-black">Our physicians</span>'
+            f'<div class="row">{cards}</div></body></html>').encode('utf-8')
+
+
+def test_medicasur_groups_details_under_each_doctor():
+    """ One pass over the physicians page keeps each doctor's card together, including
+    the photo that comes before the name; text outside the cards is dropped. """
+    metadata = open_dictionary(MEXICO_METADATA_PATH)['MedicaSur']
+    archive = HTTPArchive()
+    archive.add('GET', 'https://info.healthtravelmexico.com/medical-services/our-physicians.html',
+                medicasur_page(3))
+    with ReplayServer(archive) as replay:
+        sessions.configure(cache=None, replay=replay)
+        df = MedicaSur(metadata).scrape()
+
+    assert list(df['name']) == ['Dr. 0', 'Dr. 1', 'Dr. 2']
+    assert list(df['provider']) == ['Specialty 0', 'Specialty 1', 'Specialty 2']
+    assert list(df['photoUrl']) == ['/img/0.jpg', '/img/1.jpg', '/img/2.jpg']
+    assert df['additionalInformation'][1] == 'Board 1|Council 1'
+    assert df['otherActivities'][2] == 'Paper 2'
+    assert (df['location'] == 'Medica Sur').all()
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+from pipeline.common.spatial import EARTH_RADIUS_KM, DoctorIndex, SpatialIndex
+
+LOCATIONS_PATH = 'pipeline/resources/locations.json'
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def test_queries_match_a_full_scan():
+    """ Nearest and radius queries over locations.json give what scanning every location does. """
+    index = SpatialIndex.from_export(LOCATIONS_PATH)
+    latitudes = np.array([location['latitude'] for location in index.locations])
+    longitudes = np.array([location['longitude'] for location in index.locations])
+    rng = np.random.default_rng(0)
+    for latitude, longitude in zip(rng.uniform(8, 25, 20), rng.uniform(-100, -68, 20)):
+        distances = haversine_km(latitude, longitude, latitudes, longitudes)
+        nearest = index.nearest(latitude, longitude, n=5)
+        # Several names share coordinates, so compare distances rather than names
+        assert np.allclose([km for _, km in nearest], np.sort(distances)[:5])
+        assert np.allclose([haversine_km(latitude, longitude, location['latitude'], location['longitude'])
+                            for location, _ in nearest], np.sort(distances)[:5])
+        within = index.within(latitude, longitude, 300)
+        assert len(within) == int((distances <= 300).sum())
+
+    amerimed = index.nearest(21.1455722, -86.8234577)[0]
+    assert amerimed[0]['locationName'] == 'Amerimed Hospital' and amerimed[1] < 0.01
+
+
+def test_doctors_within_radius_of_a_point():
+    """ Doctors are found through their nested location records, each once. """
+    cancun = {'locationName': 'Amerimed Hospital', 'latitude': 21.1455722, 'longitude': -86.8234577}
+    tulum = {'locationName': 'Costamed Tulum', 'latitude': 20.2114, 'longitude': -87.4654}
+    doctors = pd.DataFrame({
+        'name': ['A', 'B', 'C', 'D'],
+        'location': [[cancun], [tulum], [tulum, cancun], [{'locationName': 'External Office', 'latitude': None}]],
+    })
+    index = DoctorIndex(doctors)
+
+    near_cancun = index.within(21.16, -86.85, km=10)
+    assert list(near_cancun['name']) == ['A', 'C']
+    assert list(index.within(21.16, -86.85, km=200)['name']) == ['A', 'C', 'B']
+    location, km, working_there = index.nearest_locations(20.2, -87.46)[0]
+    assert location['locationName'] == 'Costamed Tulum' and list(working_there['name']) == ['B', 'C']
@@ -0,0 +1,81 @@
+import time
+
+import pandas as pd
+from pipeline.common.translation_backends import DictionaryBackend, _ranges
+from pipeline.common.translation_memory import TranslationMemory
+from pipeline.common.translation_plan import TranslationPlan
+from pipeline.common.translator import Translator
+
+DICTIONARY = {'Cardiología': 'Cardiology', 'Pediatría': 'Pediatrics', 'Médico': 'Doctor'}
+
+
+class RecordingBackend(DictionaryBackend):
+    """ Dictionary backend remembering the texts sent to it. """
+
+    def __init__(self, **kwargs):
+        super().__init__(DICTIONARY, **kwargs)
+        self.sent = []
+
+    def translate_chunk(self, index, texts, source, target):
+        self.sent.extend(texts)
+        return super().translate_chunk(index, texts, source, target)
+
+
+def test_only_distinct_strings_missing_from_memory_are_sent(tmp_path):
+    """ Repeated cells are translated once, and a second run is served from memory. """
+    memory = TranslationMemory(str(tmp_path / 'translations.sqlite3'))
+    df = pd.DataFrame({
+        'name': ['Dr. A', 'Dr. B', 'Dr. C', None],
+        'provider': ['Cardiología', 'Pediatría', 'Cardiología', 'Cardiología'],
+        'description': ['Médico', '', 'Médico', None],
+        'confirmedHours': [False, False, True, False],
+    })
+
+    first = RecordingBackend()
+    translated = Translator(df, 'test', memory, source='es', backend=first).translate()
+    assert sorted(first.sent) == sorted(['Cardiología', 'Pediatría', 'Médico'])
+    assert list(translated['provider']) == ['Cardiology', 'Pediatrics', 'Cardiology', 'Cardiology']
+    assert translated['description'][0] == 'Doctor' and pd.isna(translated['description'][1])
+    assert list(translated['confirmedHours']) == [False, False, True, False]
+
+    second = RecordingBackend()
+    translator = Translator(df, 'test', memory, source='es', backend=second)
+    assert translator.translate().equals(translated)
+    assert second.sent == []
+    assert translator.stats == {'cells': 6, 'distinct': 3, 'from_memory': 3, 'sent': 0, 'saved': 3}
+
+
+def test_backend_translates_chunks_concurrently(tmp_path):
+    """ 8 chunks on 4 workers take about two chunk latencies, not eight. """
+    backend = RecordingBackend(latency=0.1, chunk_size=10, workers=4)
+    df = pd.DataFrame({'description': [f'text {i}' for i in range(80)]})
+    memory = TranslationMemory(str(tmp_path / 'translations.sqlite3'))
+    start = time.monotonic()
+    translated = Translator(df, 'test', memory, backend=backend).translate()
+    assert time.monotonic() - start < 0.5
+    assert backend.chunks == 8
+    assert translated.equals(df)
+    assert len(memory) == 0  # texts the backend could not translate are not remembered
+    assert _ranges([0, 1, 2, 5, 7, 8]) == [(0, 2), (5, 5), (7, 8)]
+
+
+def test_plan_skips_untranslatable_cells(tmp_path):
+    """ Names, known providers, urls and English text are never sent, and are counted. """
+    df = pd.DataFrame({
+        'name': ['Dr. A', 'Dr. B', 'Dr. C'],
+        'provider': ['Cardiology', 'Cardiología', 'Pediatrics | Allergist'],
+        'description': ['Médico de familia', 'Board certified in the care of children', '2255-1000'],
+        'website': ['https://example.com', None, ''],
+    })
+    backend = RecordingBackend()
+    plan = TranslationPlan()
+    translator = Translator(df, 'test', TranslationMemory(str(tmp_path / 't.sqlite3')), source='es',
+                            backend=backend, plan=plan)
+    translated = translator.translate()
+
+    assert sorted(backend.sent) == ['Cardiología', 'Médico de familia']
+    assert plan.saved == {'never': 4, 'enumeration': 2, 'english': 1, 'not_text': 1}
+    assert translator.stats['saved'] == 8 and translator.stats['cells'] == 2
+    assert list(translated['provider']) == ['Cardiology', 'Cardiology', 'Pediatrics | Allergist']
+    assert plan.skip_reason('Internal Medicine') == 'english'
+    assert plan.skip_reason('Medicina Interna') is None